@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# Head-to-head: part3 server in "select" mode vs "asyncio" mode.
+#
+#   python3 bench/bench_asyncio.py --clients 1,10,100 --depth 1,16
+import os
+import tempfile
+import argparse
+
+from bench_eventloop import (SERVERS, ROOT, raise_fd_limit, free_port, write_config,
+                             start_server, stop_server, open_connections, drive_requests)
+
+MODES = ["select", "asyncio"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="select vs asyncio server benchmark")
+    parser.add_argument("--clients", type=str, default="1,10,100", help="Concurrent active clients")
+    parser.add_argument("--depth", type=str, default="1,16", help="Outstanding requests per client")
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--words", type=str, default=os.path.join(ROOT, "part3", "words.txt"))
+    return parser.parse_args()
+
+def run_step(mode, words, n_clients, depth, k, duration):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config_path = write_config(tmpdir, port, words, {"server_mode": mode})
+        proc = start_server(SERVERS["fcfs"], config_path, port)
+        socks = []
+        try:
+            socks, _ = open_connections(port, n_clients)
+            done = drive_requests(socks, k, duration, depth)
+        finally:
+            for s in socks:
+                s.close()
+            stop_server(proc)
+    return done / duration
+
+def main():
+    args = parse_args()
+    raise_fd_limit()
+    print(f"# k={args.k}, duration={args.duration}s")
+    print(f"{'clients':>7} {'depth':>5} " + " ".join(f"{m + ' req/s':>14}" for m in MODES) + f" {'speedup':>8}")
+    for n in [int(x) for x in args.clients.split(",")]:
+        for depth in [int(x) for x in args.depth.split(",")]:
+            rates = [run_step(m, args.words, n, depth, args.k, args.duration) for m in MODES]
+            print(f"{n:>7} {depth:>5} " + " ".join(f"{r:>14.0f}" for r in rates) + f" {rates[1] / rates[0]:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
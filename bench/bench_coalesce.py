@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# part3 server with and without coalesced sends at increasing pipelining depth.
+# syscalls/request comes from the counters the server prints when it exits.
+#
+#   python3 bench/bench_coalesce.py --depth 1,8,32,128
+import os
+import re
+import tempfile
+import argparse
+import subprocess
+
+from bench_eventloop import (SERVERS, ROOT, raise_fd_limit, free_port, write_config,
+                             start_server, stop_server, open_connections, drive_requests)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Coalesced send benchmark")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--depth", type=str, default="1,8,32,128", help="Outstanding requests per client")
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--words", type=str, default=os.path.join(ROOT, "part3", "words.txt"))
+    return parser.parse_args()
+
+def run_step(coalesce, words, n_clients, depth, k, duration):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config_path = write_config(tmpdir, port, words, {"coalesce_sends": coalesce})
+        proc = start_server(SERVERS["fcfs"], config_path, port, stdout=subprocess.PIPE)
+        socks = []
+        try:
+            socks, _ = open_connections(port, n_clients)
+            done = drive_requests(socks, k, duration, depth)
+        finally:
+            for s in socks:
+                s.close()
+            stop_server(proc)
+        out = proc.stdout.read().decode()
+    m = re.search(r"syscalls_per_request=([0-9.]+)", out)
+    return done / duration, float(m.group(1)) if m else float("nan")
+
+def main():
+    args = parse_args()
+    raise_fd_limit()
+    print(f"# clients={args.clients}, k={args.k}, duration={args.duration}s")
+    print(f"{'depth':>5} {'mode':>9} {'req/s':>10} {'syscalls/req':>13}")
+    for depth in [int(x) for x in args.depth.split(",")]:
+        for coalesce in (False, True):
+            rate, per_req = run_step(coalesce, args.words, args.clients, depth, args.k, args.duration)
+            print(f"{depth:>5} {'coalesce' if coalesce else 'per-resp':>9} {rate:>10.0f} {per_req:>13.3f}")
+
+if __name__ == "__main__":
+    main()
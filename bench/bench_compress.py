@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Plain vs zlib compressed responses against the part3 server over an
+# emulated link: the client reads no faster than --mbit (token bucket on the
+# receive side, TCP flow control holds the server back like a slow link
+# would). Each step downloads the whole corpus with stop-and-wait p,k requests.
+#
+#   python3 bench/bench_compress.py --k 10,100,1000,10000 --mbit 100
+import os
+import sys
+import time
+import random
+import socket
+import tempfile
+import argparse
+
+from bench_eventloop import SERVERS, ROOT, free_port, write_config, start_server, stop_server
+
+sys.path.insert(0, ROOT)
+from common.corpus import load_words
+from common.protocol import start_zlib
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compression benchmark")
+    parser.add_argument("--k", type=str, default="10,100,1000,10000", help="Words per request")
+    parser.add_argument("--mbit", type=float, default=100.0, help="Emulated link rate")
+    parser.add_argument("--nwords", type=int, default=200000, help="Corpus size, drawn from part3/words.txt")
+    return parser.parse_args()
+
+class Link:
+    def __init__(self, mbit):
+        self.rate = mbit * 1e6 / 8
+        self.start = time.perf_counter()
+        self.bytes = 0
+
+    def recv(self, sock, size):
+        data = sock.recv(size)
+        self.bytes += len(data)
+        ahead = self.bytes / self.rate - (time.perf_counter() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+        return data
+
+def download(port, k, mbit, compress):
+    # -> (seconds, bytes on the wire, bytes of words)
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    inflater = start_zlib(sock) if compress else None
+    link = Link(mbit)
+    p = 0
+    size = 0
+    while True:
+        sock.sendall(f"{p},{k}\n".encode())
+        line = b""
+        while not line.endswith(b"\n"):
+            data = link.recv(sock, 65536)
+            if not data:
+                raise ConnectionError("server closed the connection")
+            line += inflater.decompress(data) if inflater else data
+        size += len(line)
+        if line.endswith(b"EOF\n"):
+            break
+        p += k
+    elapsed = time.perf_counter() - link.start
+    sock.close()
+    return elapsed, link.bytes, size
+
+def main():
+    args = parse_args()
+    random.seed(1)
+    vocab = sorted(set(load_words(os.path.join(ROOT, "part3", "words.txt"))[:-1]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        words = os.path.join(tmpdir, "words.txt")
+        with open(words, "w") as f:
+            f.write(",".join(random.choices(vocab, k=args.nwords)))
+        port = free_port()
+        proc = start_server(SERVERS["fcfs"], write_config(tmpdir, port, words), port)
+        try:
+            print(f"# {args.nwords} words, link {args.mbit} Mbit/s")
+            print(f"{'k':>6} {'plain ms':>9} {'zlib ms':>9} {'speedup':>8} {'plain KB':>9} {'zlib KB':>8} {'ratio':>6}")
+            for k in [int(x) for x in args.k.split(",")]:
+                plain_s, plain_bytes, _ = download(port, k, args.mbit, False)
+                zlib_s, zlib_bytes, _ = download(port, k, args.mbit, True)
+                print(f"{k:>6} {plain_s * 1000:>9.1f} {zlib_s * 1000:>9.1f} {plain_s / zlib_s:>7.1f}x "
+                      f"{plain_bytes / 1024:>9.0f} {zlib_bytes / 1024:>8.0f} {plain_bytes / zlib_bytes:>5.1f}x")
+        finally:
+            stop_server(proc)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Accept / request rate of the part3 (FCFS) and part4 (RR) servers as the
+# number of connected clients grows. Runs on loopback, no mininet needed.
+#
+#   python3 bench/bench_eventloop.py --counts 10,100,1000,10000
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import resource
+import selectors
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SERVERS = {
+    "fcfs": os.path.join(ROOT, "part3", "server.py"),
+    "rr": os.path.join(ROOT, "part4", "server.py"),
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Event loop scaling benchmark")
+    parser.add_argument("--servers", type=str, default="fcfs,rr", help="Comma separated subset of: " + ",".join(SERVERS))
+    parser.add_argument("--counts", type=str, default="10,100,1000,10000", help="Total connections per step")
+    parser.add_argument("--active", type=int, default=10, help="Connections issuing requests, the rest stay idle")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds of request traffic per step")
+    parser.add_argument("--k", type=int, default=5, help="Words per request")
+    parser.add_argument("--words", type=str, default=os.path.join(ROOT, "part3", "words.txt"))
+    return parser.parse_args()
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+def free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+def write_config(tmpdir, port, words, extra=None):
+    cfg = {
+        "server_ip": "127.0.0.1",
+        "server_port": port,
+        "filename": os.path.abspath(words),
+        "backlog": 4096,
+    }
+    cfg.update(extra or {})
+    path = os.path.join(tmpdir, "config.json")
+    with open(path, "w") as f:
+        json.dump(cfg, f)
+    return path
+
+def start_server(script, config_path, port, stdout=subprocess.DEVNULL):
+    proc = subprocess.Popen([sys.executable, script, "--config", config_path],
+                            stdout=stdout, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"server {script} did not come up")
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def read_line(sock):
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def open_connections(port, n):
+    # connect everything, then prove each one was accepted by the server with
+    # a tiny request; accept rate = n / time until every client got its reply
+    start = time.perf_counter()
+    socks = []
+    for _ in range(n):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        socks.append(s)
+    for s in socks:
+        s.sendall(b"0,1\n")
+    for s in socks:
+        read_line(s)
+    return socks, time.perf_counter() - start
+
+def drive_requests(socks, k, duration, depth=1):
+    # every active socket keeps `depth` requests outstanding (1 = stop-and-wait)
+    sel = selectors.DefaultSelector()
+    msg = f"0,{k}\n".encode()
+    bufs = {}
+    for s in socks:
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ)
+        bufs[s] = b""
+        s.send(msg * depth)
+    done = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        for key, _ in sel.select(0.1):
+            s = key.fileobj
+            data = s.recv(65536)
+            if not data:
+                sel.unregister(s)
+                continue
+            buf = bufs[s] + data
+            n = buf.count(b"\n")
+            if n:
+                done += n
+                buf = buf[buf.rfind(b"\n") + 1:]
+                s.send(msg * n)
+            bufs[s] = buf
+    sel.close()
+    for s in socks:
+        s.setblocking(True)
+    return done
+
+def run_step(script, words, n_total, n_active, k, duration):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config_path = write_config(tmpdir, port, words)
+        proc = start_server(script, config_path, port)
+        socks = []
+        try:
+            socks, accept_s = open_connections(port, n_total)
+            done = drive_requests(socks[:n_active], k, duration)
+        finally:
+            for s in socks:
+                s.close()
+            stop_server(proc)
+    return n_total / accept_s, done / duration
+
+def main():
+    args = parse_args()
+    limit = raise_fd_limit()
+    counts = [int(x) for x in args.counts.split(",")]
+    print(f"# fd limit {limit}, active={args.active}, k={args.k}, duration={args.duration}s")
+    print(f"{'server':>6} {'conns':>6} {'accept/s':>10} {'req/s':>10}")
+    for name in args.servers.split(","):
+        for n in counts:
+            if 2 * n + 32 > limit:
+                print(f"{name:>6} {n:>6}   skipped (fd limit)")
+                continue
+            accept_rate, req_rate = run_step(SERVERS[name], args.words, n, min(args.active, n), args.k, args.duration)
+            print(f"{name:>6} {n:>6} {accept_rate:>10.0f} {req_rate:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# Latency of small-k clients next to a client asking for huge ranges, with
+# response building inline vs offloaded to the thread pool
+# ("offload_threshold"). Uses the ids corpus, where building a response is
+# linear in k. The big client and the small clients run stop-and-wait.
+#
+#   python3 bench/bench_offload.py --big_k 200000 --threshold 10000
+import os
+import sys
+import time
+import random
+import socket
+import tempfile
+import argparse
+import threading
+
+from bench_eventloop import SERVERS, ROOT, free_port, write_config, start_server, stop_server, read_line
+
+sys.path.insert(0, ROOT)
+from common.corpus import load_words
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offload benchmark")
+    parser.add_argument("--big_k", type=int, default=200000, help="Words per request of the big client")
+    parser.add_argument("--small", type=int, default=4, help="Small clients")
+    parser.add_argument("--threshold", type=int, default=10000, help="offload_threshold of the offload run")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per run")
+    parser.add_argument("--nwords", type=int, default=1000000, help="Corpus size, drawn from part3/words.txt")
+    return parser.parse_args()
+
+def client(port, k, nwords, end, latencies):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    p = 0
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        sock.sendall(f"{p},{k}\n".encode())
+        read_line(sock)
+        latencies.append(time.perf_counter() - start)
+        # stay clear of the end of the corpus, an EOF would close the connection
+        p = (p + k) % (nwords - k - 1)
+    sock.close()
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def run(words, nwords, args, threshold):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config = write_config(tmpdir, port, words, {"corpus_mode": "ids", "offload_threshold": threshold,
+                                                     "reload_interval": 0})
+        proc = start_server(SERVERS["fcfs"], config, port)
+        try:
+            end = time.perf_counter() + args.duration
+            big = []
+            small = [[] for _ in range(args.small)]
+            threads = [threading.Thread(target=client, args=(port, args.big_k, nwords, end, big))]
+            threads += [threading.Thread(target=client, args=(port, 5, nwords, end, lat)) for lat in small]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            stop_server(proc)
+    small = [x for lat in small for x in lat]
+    return len(small) / args.duration, percentile(small, 0.5), percentile(small, 0.99), len(big) / args.duration
+
+def main():
+    args = parse_args()
+    random.seed(1)
+    vocab = sorted(set(load_words(os.path.join(ROOT, "part3", "words.txt"))[:-1]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        words = os.path.join(tmpdir, "words.txt")
+        with open(words, "w") as f:
+            f.write(",".join(random.choices(vocab, k=args.nwords)))
+        print(f"# ids corpus, {args.nwords} words, 1 client k={args.big_k} + {args.small} clients k=5")
+        print(f"{'mode':>8} {'small req/s':>12} {'p50 ms':>8} {'p99 ms':>8} {'big req/s':>10}")
+        for name, threshold in (("inline", 0), ("offload", args.threshold)):
+            rate, p50, p99, big = run(words, args.nwords, args, threshold)
+            print(f"{name:>8} {rate:>12.0f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {big:>10.1f}")
+
+if __name__ == "__main__":
+    main()
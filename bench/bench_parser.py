@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Request framing cost at high pipelining depth: the old str parsers (decode,
+# join with the leftover and split, or split one line at a time) against
+# RecvBuffer + AutoCodec.parse. No sockets, each read hands over the next
+# --chunk bytes of the stream, so only framing is measured. The "long" stream
+# is one request padded to --long bytes, where re-joining the leftover on
+# every read is quadratic.
+#
+#   python3 bench/bench_parser.py --depth 100000 --chunk 65536,4096,64
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.protocol import AutoCodec, MAX_LINE
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Request parser benchmark")
+    parser.add_argument("--depth", type=int, default=100000, help="Pipelined requests in the stream")
+    parser.add_argument("--chunk", type=str, default="65536,4096,64", help="Bytes per read")
+    parser.add_argument("--long", type=int, default=60000, help="Length of the padded request of the long stream")
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+def split_all(sock, size):
+    # the former TextCodec.feed
+    buf = ""
+    reqs = 0
+    while True:
+        data = sock.recv(size)
+        if not data:
+            return reqs
+        buf = buf + data.decode('utf-8', errors='replace')
+        lines = buf.split('\n')
+        buf = lines.pop()
+        reqs += len([line for line in (l.strip() for l in lines) if line])
+
+def split_one(sock, size):
+    # per connection str buffer, one split('\n', 1) per line
+    buf = ""
+    reqs = 0
+    while True:
+        data = sock.recv(size)
+        if not data:
+            return reqs
+        buf = buf + data.decode()
+        while "\n" in buf:
+            line, buf = buf.split("\n", 1)
+            if line.strip():
+                reqs += 1
+
+def recv_buffer(sock, size):
+    codec = AutoCodec()
+    reqs = 0
+    while codec.rbuf.recv_into(sock, size):
+        reqs += len(codec.parse())
+    return reqs
+
+PARSERS = [("split", split_all), ("split1", split_one), ("recvbuf", recv_buffer)]
+
+class Feeder:
+    # stands in for the socket: every read returns the next chunk, recv_into
+    # copies it into the caller's buffer like the kernel would
+    def __init__(self, chunks):
+        self.it = iter(chunks)
+
+    def recv(self, n):
+        return next(self.it)
+
+    def recv_into(self, buf, n=0):
+        chunk = next(self.it)
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+def run(parser, stream, size):
+    chunks = [stream[i:i + size] for i in range(0, len(stream), size)] + [b""]
+    start = time.perf_counter()
+    reqs = parser(Feeder(chunks), size)
+    return reqs, time.perf_counter() - start
+
+def main():
+    args = parse_args()
+    streams = [("pipelined", b"".join(b"%d,5\n" % (i % 10000) for i in range(args.depth))),
+               ("long", b" " * (min(args.long, MAX_LINE) - 4) + b"0,5\n")]
+    print(f"# depth {args.depth}, long request {len(streams[1][1])} bytes, best of {args.repeat}")
+    print(f"{'stream':>10} {'chunk':>6} {'parser':>8} {'reqs':>7} {'ms':>9} {'Mreq/s':>7}")
+    for name, stream in streams:
+        for size in [int(x) for x in args.chunk.split(",")]:
+            for pname, parser in PARSERS:
+                best = None
+                for _ in range(args.repeat):
+                    reqs, elapsed = run(parser, stream, size)
+                    best = elapsed if best is None else min(best, elapsed)
+                print(f"{name:>10} {size:>6} {pname:>8} {reqs:>7} {best * 1000:>9.2f} {reqs / best / 1e6:>7.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Requests/s of the part3 server with 1, 2, 4 ... prefork workers
+# ("workers" in config.json). The load comes from several generator
+# processes so the clients are not the bottleneck; every generator keeps
+# --conns connections busy with stop-and-wait p,k requests. Scaling needs
+# free cores for both the workers and the generators.
+#
+#   python3 bench/bench_prefork.py --workers 1,2,4 --procs 4
+import os
+import sys
+import time
+import tempfile
+import argparse
+import multiprocessing
+
+from bench_eventloop import SERVERS, ROOT, free_port, write_config, start_server, stop_server, open_connections, drive_requests
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prefork scaling benchmark")
+    parser.add_argument("--workers", type=str, default="1,2,4", help="Worker counts to try")
+    parser.add_argument("--procs", type=int, default=4, help="Load generator processes")
+    parser.add_argument("--conns", type=int, default=16, help="Connections per generator")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of request traffic per step")
+    parser.add_argument("--k", type=int, default=5, help="Words per request")
+    parser.add_argument("--mode", type=str, default="blob", help="corpus_mode of the server")
+    parser.add_argument("--words", type=str, default=os.path.join(ROOT, "part3", "words.txt"))
+    return parser.parse_args()
+
+def generate(port, conns, k, duration, results):
+    socks, _ = open_connections(port, conns)
+    results.put(drive_requests(socks, k, duration))
+    for s in socks:
+        s.close()
+
+def run_step(args, workers):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config_path = write_config(tmpdir, port, args.words,
+                                   {"workers": workers, "corpus_mode": args.mode, "reload_interval": 0})
+        proc = start_server(SERVERS["fcfs"], config_path, port)
+        # let every worker get to its accept loop
+        time.sleep(0.5)
+        try:
+            results = multiprocessing.Queue()
+            gens = [multiprocessing.Process(target=generate, args=(port, args.conns, args.k, args.duration, results))
+                    for _ in range(args.procs)]
+            for g in gens:
+                g.start()
+            done = sum(results.get() for _ in gens)
+            for g in gens:
+                g.join()
+        finally:
+            stop_server(proc)
+    return done / args.duration
+
+def main():
+    args = parse_args()
+    print(f"# {os.cpu_count()} cpus, {args.procs} generators x {args.conns} connections, k={args.k}, {args.mode}")
+    print(f"{'workers':>7} {'req/s':>10} {'speedup':>8}")
+    base = None
+    for workers in [int(x) for x in args.workers.split(",")]:
+        rate = run_step(args, workers)
+        base = base or rate
+        print(f"{workers:>7} {rate:>10.0f} {rate / base:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# Text vs binary vs binary+ids protocol against the part3 server: pipelined
+# clients on loopback, responses fully parsed and counted client side.
+#
+#   python3 bench/bench_protocol.py --k 5,100,1000 --depth 16
+import os
+import sys
+import time
+import socket
+import tempfile
+import argparse
+import selectors
+from collections import Counter
+
+from bench_eventloop import (SERVERS, ROOT, raise_fd_limit, free_port, write_config,
+                             start_server, stop_server)
+
+sys.path.insert(0, ROOT)
+from common.protocol import PREAMBLE, OPT_IDS, REQUEST, RESPONSE, OP_RANGE, F_VOCAB, F_IDS
+
+MODES = ["text", "binary", "ids"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Protocol benchmark")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=16, help="Outstanding requests per client")
+    parser.add_argument("--k", type=str, default="5,100,1000", help="Words per request")
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--words", type=str, default=os.path.join(ROOT, "part3", "words.txt"))
+    return parser.parse_args()
+
+def parse_text(buf, counts):
+    # -> (responses, rest)
+    end = buf.rfind(b"\n") + 1
+    if not end:
+        return 0, buf
+    lines = buf[:end].decode().split("\n")[:-1]
+    for line in lines:
+        counts.update(line.split(","))
+    return len(lines), buf[end:]
+
+def parse_binary(buf, counts):
+    done = 0
+    pos = 0
+    while len(buf) - pos >= RESPONSE.size:
+        flags, length = RESPONSE.unpack_from(buf, pos)
+        if len(buf) - pos - RESPONSE.size < length:
+            break
+        payload = buf[pos + RESPONSE.size:pos + RESPONSE.size + length]
+        pos += RESPONSE.size + length
+        if flags & F_VOCAB:
+            continue
+        if flags & F_IDS:
+            counts.update(memoryview(payload).cast('I'))
+        elif payload:
+            counts.update(payload.decode().split(","))
+        done += 1
+    return done, buf[pos:]
+
+def drive(port, mode, n_clients, depth, k, duration):
+    # p stays below the corpus end so no response carries EOF
+    sel = selectors.DefaultSelector()
+    if mode == "text":
+        msg, parse = f"0,{k}\n".encode(), parse_text
+    else:
+        msg, parse = REQUEST.pack(OP_RANGE, 0, k), parse_binary
+    bufs = {}
+    counts = Counter()
+    for _ in range(n_clients):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if mode != "text":
+            s.sendall(PREAMBLE + bytes([OPT_IDS if mode == "ids" else 0]))
+        s.sendall(msg * depth)
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ)
+        bufs[s] = b""
+    done = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        for key, _ in sel.select(0.1):
+            s = key.fileobj
+            data = s.recv(1 << 20)
+            if not data:
+                sel.unregister(s)
+                continue
+            n, bufs[s] = parse(bufs[s] + data, counts)
+            if n:
+                done += n
+                s.send(msg * n)
+    for s in bufs:
+        s.close()
+    sel.close()
+    return done
+
+def run_step(mode, words, n_clients, depth, k, duration):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config_path = write_config(tmpdir, port, words)
+        proc = start_server(SERVERS["fcfs"], config_path, port)
+        try:
+            done = drive(port, mode, n_clients, depth, k, duration)
+        finally:
+            stop_server(proc)
+    return done / duration
+
+def main():
+    args = parse_args()
+    raise_fd_limit()
+    print(f"# clients={args.clients}, depth={args.depth}, duration={args.duration}s")
+    print(f"{'k':>6} " + " ".join(f"{m + ' req/s':>13}" for m in MODES))
+    for k in [int(x) for x in args.k.split(",")]:
+        rates = [run_step(m, args.words, args.clients, args.depth, k, args.duration) for m in MODES]
+        print(f"{k:>6} " + " ".join(f"{r:>13.0f}" for r in rates))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Server CPU per request as k grows, for the blob, mmap and sendfile corpus
+# modes. A few clients pipeline --depth text requests each and drain the
+# responses without parsing them; the server's CPU time is read from
+# /proc/<pid>/stat. In sendfile mode the words go from the page cache to the
+# socket without being copied through the server process.
+#
+#   python3 bench/bench_sendfile.py --k 100,1000,10000,100000
+import os
+import sys
+import time
+import random
+import socket
+import tempfile
+import argparse
+import selectors
+
+from bench_eventloop import SERVERS, ROOT, free_port, write_config, start_server, stop_server
+
+sys.path.insert(0, ROOT)
+from common.corpus import load_words
+
+MODES = ["blob", "mmap", "sendfile"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="sendfile benchmark")
+    parser.add_argument("--k", type=str, default="100,1000,10000,100000", help="Words per request")
+    parser.add_argument("--modes", type=str, default=",".join(MODES))
+    parser.add_argument("--clients", type=int, default=2)
+    parser.add_argument("--depth", type=int, default=4, help="Outstanding requests per client")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds per run")
+    parser.add_argument("--nwords", type=int, default=2000000, help="Corpus size, drawn from part3/words.txt")
+    return parser.parse_args()
+
+def cpu_seconds(pid):
+    # utime + stime of the process
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def drive(port, k, nwords, clients, depth, duration):
+    # -> (responses, bytes) received within duration
+    sel = selectors.DefaultSelector()
+    socks = []
+    nreq = nwords // k - 1
+    for i in range(clients):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ, [i * 7919 % nreq])
+        s.send(b"".join(f"{(i * 7919 + j) % nreq * k},{k}\n".encode() for j in range(depth)))
+        socks.append(s)
+    done = 0
+    nbytes = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        for key, _ in sel.select(0.1):
+            s, state = key.fileobj, key.data
+            data = s.recv(1 << 20)
+            if not data:
+                sel.unregister(s)
+                continue
+            nbytes += len(data)
+            lines = data.count(b"\n")
+            done += lines
+            if lines:
+                # keep depth requests in flight, never reaching the end of the corpus
+                reqs = []
+                for _ in range(lines):
+                    state[0] = (state[0] + 1) % nreq
+                    reqs.append(f"{state[0] * k},{k}\n".encode())
+                s.setblocking(True)
+                s.sendall(b"".join(reqs))
+                s.setblocking(False)
+    for s in socks:
+        s.close()
+    return done, nbytes
+
+def run(words, mode, k, args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        config = write_config(tmpdir, port, words, {"corpus_mode": mode, "reload_interval": 0})
+        proc = start_server(SERVERS["fcfs"], config, port)
+        try:
+            cpu = cpu_seconds(proc.pid)
+            done, nbytes = drive(port, k, args.nwords, args.clients, args.depth, args.duration)
+            cpu = cpu_seconds(proc.pid) - cpu
+        finally:
+            stop_server(proc)
+    return done / args.duration, nbytes / args.duration, cpu / max(done, 1)
+
+def main():
+    args = parse_args()
+    random.seed(1)
+    vocab = sorted(set(load_words(os.path.join(ROOT, "part3", "words.txt"))[:-1]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        words = os.path.join(tmpdir, "words.txt")
+        with open(words, "w") as f:
+            f.write(",".join(random.choices(vocab, k=args.nwords)))
+        print(f"# {args.nwords} words, {args.clients} clients x depth {args.depth}")
+        print(f"{'k':>7} {'mode':>9} {'req/s':>9} {'MB/s':>8} {'cpu us/req':>11} {'cpu us/KB':>10}")
+        for k in [int(x) for x in args.k.split(",")]:
+            for mode in args.modes.split(","):
+                rate, bps, cpu = run(words, mode, k, args)
+                per_kb = cpu / (bps / rate / 1024) if rate else 0.0
+                print(f"{k:>7} {mode:>9} {rate:>9.0f} {bps / 1e6:>8.1f} {cpu * 1e6:>11.1f} {per_kb * 1e6:>10.3f}")
+
+if __name__ == "__main__":
+    main()
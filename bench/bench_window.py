@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# Whole-corpus download time of the part3 client with stop-and-wait, fixed
+# batches of c and the adaptive --window, through a proxy that emulates a
+# link: --rtt_ms of delay (half each way) and --mbit of bandwidth towards
+# the client. Runs the real client.py against the part3 server, every
+# client --repeat times, and reports the median. Exits with status 1 when
+# the window is more than --margin slower than the best fixed c.
+#
+#   python3 bench/bench_window.py --rtt_ms 10 --mbit 50 --k 100
+#   python3 bench/bench_window.py --rtt_ms 0 --mbit 0 --k 10 --binary
+import os
+import re
+import sys
+import time
+import heapq
+import random
+import socket
+import tempfile
+import argparse
+import threading
+import subprocess
+
+from bench_eventloop import SERVERS, ROOT, free_port, write_config, start_server, stop_server
+
+sys.path.insert(0, ROOT)
+from common.corpus import load_words
+
+CLIENT = os.path.join(ROOT, "part3", "client.py")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sliding window benchmark")
+    parser.add_argument("--rtt_ms", type=float, default=10.0, help="Emulated round trip time")
+    parser.add_argument("--mbit", type=float, default=50.0, help="Emulated bandwidth towards the client, 0 = unlimited")
+    parser.add_argument("--k", type=int, default=100, help="Words per request")
+    parser.add_argument("--c", type=str, default="4,16,64", help="Batch sizes to compare with")
+    parser.add_argument("--nwords", type=int, default=50000, help="Corpus size, drawn from part3/words.txt")
+    parser.add_argument("--binary", action="store_true", help="Use the binary protocol")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per client, the median is reported")
+    parser.add_argument("--margin", type=float, default=0.2, help="Allowed slowdown of the window against the best c")
+    return parser.parse_args()
+
+def pipe(src, dst, delay, rate):
+    # forward src -> dst, every chunk delivered delay seconds after it was
+    # read and no faster than rate bytes/s
+    queue = []
+    cond = threading.Condition()
+
+    def reader():
+        seq = 0
+        while True:
+            try:
+                data = src.recv(65536)
+            except OSError:
+                data = b""
+            with cond:
+                seq += 1
+                heapq.heappush(queue, (time.perf_counter() + delay, seq, data))
+                cond.notify()
+            if not data:
+                return
+
+    def writer():
+        free = 0.0
+        while True:
+            with cond:
+                while not queue:
+                    cond.wait()
+                due, _, data = heapq.heappop(queue)
+            wait = max(due, free) - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            if not data:
+                try:
+                    dst.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                return
+            try:
+                dst.sendall(data)
+            except OSError:
+                return
+            free = max(due, free) + (len(data) / rate if rate else 0.0)
+
+    for fn in (reader, writer):
+        threading.Thread(target=fn, daemon=True).start()
+
+def proxy(listener, server_port, rtt, rate):
+    while True:
+        try:
+            client, _ = listener.accept()
+        except OSError:
+            return
+        upstream = socket.create_connection(("127.0.0.1", server_port))
+        for s in (client, upstream):
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pipe(client, upstream, rtt / 2, 0)
+        pipe(upstream, client, rtt / 2, rate)
+
+def run_client(config, flags):
+    # the client reads config.json from its working directory
+    out = subprocess.run([sys.executable, CLIENT, "--config", config, "--quiet"] + flags,
+                         capture_output=True, text=True, timeout=600, cwd=os.path.dirname(config)).stdout
+    elapsed = float(re.search(r"ELAPSED_MS:([0-9.]+)", out).group(1))
+    window = re.search(r"WINDOW:(.*)", out)
+    return elapsed, window.group(1) if window else ""
+
+def median_run(config, flags, repeat):
+    # -> (median elapsed, window line of that run)
+    runs = sorted(run_client(config, flags) for _ in range(repeat))
+    return runs[len(runs) // 2]
+
+def main():
+    args = parse_args()
+    random.seed(1)
+    vocab = sorted(set(load_words(os.path.join(ROOT, "part3", "words.txt"))[:-1]))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        words = os.path.join(tmpdir, "words.txt")
+        with open(words, "w") as f:
+            f.write(",".join(random.choices(vocab, k=args.nwords)))
+        port = free_port()
+        server_config = write_config(tmpdir, port, words, {"reload_interval": 0})
+        proc = start_server(SERVERS["fcfs"], server_config, port)
+        listener = socket.create_server(("127.0.0.1", 0))
+        threading.Thread(target=proxy, args=(listener, port, args.rtt_ms / 1000, args.mbit * 1e6 / 8),
+                         daemon=True).start()
+        client_dir = os.path.join(tmpdir, "client")
+        os.mkdir(client_dir)
+        config = write_config(client_dir, listener.getsockname()[1], words, {"k": args.k, "p": 0, "c": 1, "quiet": True})
+        runs = [("stop-and-wait", [])]
+        runs += [(f"c={c}", ["--is_greedy", "--c", c]) for c in args.c.split(",")]
+        runs += [("window", ["--window"])]
+        if args.binary:
+            runs = [(name, flags + ["--binary"]) for name, flags in runs]
+        times = {}
+        try:
+            link = f"{args.mbit} Mbit/s" if args.mbit else "unlimited"
+            proto = "binary" if args.binary else "text"
+            print(f"# {args.nwords} words, k={args.k}, {proto}, rtt {args.rtt_ms} ms, {link}, median of {args.repeat}")
+            print(f"{'client':>14} {'ms':>9} {'req/s':>8}  window")
+            nreq = args.nwords // args.k + 1
+            for name, flags in runs:
+                elapsed, window = median_run(config, flags, args.repeat)
+                times[name] = elapsed
+                print(f"{name:>14} {elapsed:>9.1f} {nreq / elapsed * 1000:>8.0f}  {window}")
+        finally:
+            listener.close()
+            stop_server(proc)
+    best = min(elapsed for name, elapsed in times.items() if name.startswith("c="))
+    slower = times["window"] / best - 1
+    print(f"# window vs best fixed c: {slower * 100:+.0f}% (margin {args.margin * 100:.0f}%)")
+    if slower > args.margin:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import signal
+import asyncio
+
+from common.eventloop import HIGH_WATER, LOW_WATER
+from common.protocol import AutoCodec
+
+
+class WordProtocol(asyncio.Protocol):
+    # one instance per connection, text or binary as negotiated by AutoCodec.
+    # responses produced by one data_received call are batched into one write.
+    # The transport's write buffer limits play the role of the select
+    # server's watermarks: above high_water we stop reading the client (and
+    # stop answering its buffered requests) until the buffer drains.
+    # Timeouts work as in the select server: one call_later handle per
+    # connection that re-arms itself for the nearest of the idle and the
+    # request deadline. Output still in the transport counts as activity.
+
+    def __init__(self, corpus, high_water=HIGH_WATER, low_water=LOW_WATER, idle_timeout=0, request_timeout=0,
+                 active=None):
+        self.corpus = corpus
+        self.active = active if active is not None else set()
+        self.codec = AutoCodec()
+        self.high_water = high_water
+        self.low_water = low_water
+        self.transport = None
+        self.pending = []
+        self.paused = False
+        self.done = False
+        self.idle_timeout = idle_timeout
+        self.request_timeout = request_timeout
+        self.loop = None
+        self.timer = None
+        self.last_active = 0.0
+        self.partial_since = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.active.add(self)
+        transport.set_write_buffer_limits(self.high_water, self.low_water)
+        self.loop = asyncio.get_running_loop()
+        self.last_active = self.loop.time()
+        if self.idle_timeout:
+            self.timer = self.loop.call_later(self.idle_timeout, self.check_timeouts)
+
+    def check_timeouts(self):
+        self.timer = None
+        if self.transport is None:
+            return
+        now = self.loop.time()
+        if self.pending or self.transport.get_write_buffer_size():
+            # requests or output the server still owes the client
+            self.last_active = now
+        wait = float("inf")
+        if self.idle_timeout:
+            left = self.last_active + self.idle_timeout - now
+            if left <= 0:
+                self.transport.close()
+                return
+            wait = left
+        # while reading is paused the request deadline is stopped
+        if self.request_timeout and self.partial_since and not self.paused:
+            left = self.partial_since + self.request_timeout - now
+            if left <= 0:
+                self.transport.close()
+                return
+            wait = min(wait, left)
+        if wait != float("inf"):
+            self.timer = self.loop.call_later(wait, self.check_timeouts)
+
+    def data_received(self, data):
+        if self.done:
+            # requests after EOF are discarded until the client closes
+            return
+        self.last_active = self.loop.time()
+        self.pending.extend(self.codec.feed(data))
+        if self.codec.partial():
+            if not self.partial_since:
+                self.partial_since = self.last_active
+                if self.request_timeout:
+                    # the request deadline is nearer than any idle deadline
+                    if self.timer is not None:
+                        self.timer.cancel()
+                    self.timer = self.loop.call_later(self.request_timeout, self.check_timeouts)
+        else:
+            self.partial_since = 0
+        self.serve_pending()
+
+    def serve_pending(self):
+        pending = self.pending
+        out = []
+        size = 0
+        i = 0
+        while not self.paused and i < len(pending):
+            response, eof = self.codec.respond(pending[i], self.corpus)
+            i += 1
+            out.extend(response)
+            # close after EOF so the client can finish; only the write side,
+            # closing with unread requests would reset the connection
+            if eof:
+                self.transport.write(b"".join(out))
+                self.transport.write_eof()
+                self.done = True
+                self.pending = []
+                return
+            size += sum(len(b) for b in response)
+            if size > self.high_water:
+                # may call pause_writing() and end the loop
+                self.transport.write(b"".join(out))
+                out = []
+                size = 0
+        if out:
+            self.transport.write(b"".join(out))
+        del pending[:i]
+
+    def pause_writing(self):
+        self.paused = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.paused = False
+        if self.transport.is_closing() or self.done:
+            return
+        if self.partial_since:
+            # the cut off request gets its full request_timeout from now on
+            self.partial_since = self.loop.time()
+            if self.request_timeout:
+                if self.timer is not None:
+                    self.timer.cancel()
+                self.timer = self.loop.call_later(self.request_timeout, self.check_timeouts)
+        self.transport.resume_reading()
+        self.serve_pending()
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.active.discard(self)
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+def serve(ip, port, reloader, backlog=128, high_water=HIGH_WATER, low_water=LOW_WATER, reuse_port=False,
+          idle_timeout=0, request_timeout=0):
+    # every connection is served from the corpus that was current when it was accepted.
+    # A prefork worker (reuse_port) drains on SIGHUP like the select server:
+    # it stops listening and returns once its last connection has closed.
+    async def run():
+        loop = asyncio.get_running_loop()
+        active = set()
+        server = await loop.create_server(lambda: WordProtocol(reloader.corpus, high_water, low_water,
+                                                               idle_timeout, request_timeout, active),
+                                          ip, port, backlog=backlog, reuse_address=True,
+                                          reuse_port=reuse_port)
+        done = loop.create_future()
+        draining = []
+
+        def drain():
+            draining.append(True)
+            server.close()
+
+        def poll():
+            reloader.poll()
+            if draining and not active:
+                done.set_result(None)
+                return
+            loop.call_later(reloader.interval or (0.5 if draining else 1.0), poll)
+
+        if reuse_port:
+            loop.add_signal_handler(signal.SIGHUP, drain)
+        poll()
+        async with server:
+            await done
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
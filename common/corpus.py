@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+import os
+from array import array
+from collections import Counter, OrderedDict
+from itertools import accumulate
+
+from common.corpus_cache import open_index, map_file
+from common.eventloop import FileRange
+from common.histogram import RangeCounter, COUNT_BLOCK
+from common.response_cache import ResponseCache
+
+EOF_WORD = "EOF"
+EOF_LINE = b"EOF\n"
+NEWLINE = b"\n"
+EOF_TAIL = b",EOF\n"
+EOF_EOF_TAIL = b"EOF,EOF\n"
+# shortest range sent with os.sendfile in sendfile mode
+SENDFILE_MIN_BYTES = 256 * 1024
+
+
+def load_words(filename="words.txt"):
+    words = []
+    with open(filename, "r") as f:
+        for line in f:
+            for w in line.strip().split(","):
+                w = w.strip()
+                if w:
+                    words.append(w)
+    words.append(EOF_WORD)
+    return words
+
+
+class BaseCorpus:
+    # n counts the EOF sentinel; index is the compiled sidecar (word ids, vocab)
+    n = 0
+    index = None
+    count_block = COUNT_BLOCK
+    counter = None
+    words_by_id = None
+    # optional ResponseCache in front of lookup() for text requests
+    cache = None
+    # True when ranges can be served as FileRanges (file_lookup / file_payload)
+    sendfile = False
+    # (st_dev, st_ino) of the words file when it is mapped rather than copied
+    mapped = None
+
+    def __len__(self):
+        return self.n
+
+    def payload(self, p, k, word_range=None):
+        # words p..p+k-1 without the sentinel -> (list of buffers, eof), used by
+        # the binary protocol where EOF is a flag instead of a word
+        n = self.n
+        if p < 0 or p >= n:
+            return [], True
+        end = min(p + k, n)
+        last = min(end, n - 1)
+        return ([(word_range or self.word_range)(p, last)] if last > p else []), end >= n
+
+    def ids_payload(self, p, k):
+        # same range as payload() as uint32 word ids, a zero-copy slice of the sidecar
+        n = self.n
+        if p < 0 or p >= n:
+            return [], True
+        end = min(p + k, n)
+        last = min(end, n - 1)
+        return ([memoryview(self.index.ids)[p:last].cast('B')] if last > p else []), end >= n
+
+    def vocab(self):
+        # distinct words as bytes, list position == word id
+        if self.words_by_id is None:
+            self.words_by_id = self.index.vocab()
+        return self.words_by_id
+
+    def vocab_payload(self):
+        return b",".join(self.vocab())
+
+    def build_counter(self):
+        # block histograms for COUNT ("count_index"), built at load so that
+        # no request pays for them (on a reload, in the reloader's thread)
+        index = self.index
+        self.counter = RangeCounter(index.ids, len(index.vocab_offsets) - 1, self.count_block)
+
+    def range_counts(self, p, k):
+        # {word id: count} over words p..p+k-1
+        if p < 0:
+            return {}
+        if self.counter is None:
+            # no block histograms: one pass over the range, O(k)
+            ids = self.index.ids
+            return dict(Counter(ids[p:min(p + k, len(ids))]))
+        return self.counter.counts(p, p + k)
+
+
+class Corpus(BaseCorpus):
+    # the whole word list pre-encoded as one comma joined blob plus an offset
+    # index: offsets[i] is where word i starts, offsets[n] == len(blob) + 1.
+    # Any range p..end-1 is blob[offsets[p]:offsets[end] - 1], so a response
+    # is a memoryview slice and costs O(1) regardless of k.
+
+    def __init__(self, blob, offsets, index=None):
+        self.blob = blob
+        self.view = memoryview(blob)
+        self.offsets = offsets
+        self.n = len(offsets) - 1
+        self.index = index
+
+    @classmethod
+    def from_words(cls, words):
+        encoded = [w.encode('utf-8') if isinstance(w, str) else w for w in words]
+        offsets = array('Q', [0])
+        pos = 0
+        for w in encoded:
+            pos += len(w) + 1
+            offsets.append(pos)
+        return cls(b",".join(encoded), offsets)
+
+    @classmethod
+    def from_index(cls, data, index):
+        # data is the raw words file, index its compiled sidecar
+        if not index.clean:
+            vocab = index.vocab()
+            corpus = cls.from_words([vocab[i] for i in index.ids] + [EOF_WORD])
+            corpus.index = index
+            return corpus
+        # a clean file already is the blob up to the last word, the offsets
+        # are the sidecar's starts; only the sentinel has to be appended
+        n = index.nwords
+        blob = bytes(data[:index.starts[n] - 1]) + b",EOF" if n else b"EOF"
+        offsets = array('Q')
+        offsets.frombytes(index.starts.tobytes())
+        offsets.append(len(blob) + 1)
+        return cls(blob, offsets, index)
+
+    def word_range(self, p, end):
+        return self.view[self.offsets[p]:self.offsets[end] - 1]
+
+    def lookup(self, p, k):
+        # -> (list of bytes-like buffers, eof)
+        n = self.n
+        if p < 0 or p >= n:
+            return [EOF_LINE], True
+        end = min(p + k, n)
+        eof = end >= n
+        if end <= p:
+            return [EOF_LINE if eof else NEWLINE], eof
+        return [self.word_range(p, end), EOF_TAIL if eof else NEWLINE], eof
+
+
+class MmapCorpus(BaseCorpus):
+    # serves ranges straight from a mapping of the words file using the word
+    # offsets of the compiled sidecar (see corpus_cache.py). For a clean file a
+    # range is one contiguous slice of the mapping, otherwise the words are
+    # joined. The file's own words are 0..n-2, word n-1 is the EOF sentinel
+    # load_words appends.
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self.mm = map_file(f)
+            st = os.fstat(f.fileno())
+            self.mapped = (st.st_dev, st.st_ino)
+        self.view = memoryview(self.mm)
+        index = open_index(filename, self.mm)
+        self.index = index
+        self.starts, self.ends, self.clean = index.starts, index.ends, index.clean
+        self.n = index.nwords + 1
+
+    def word_range(self, p, end):
+        if self.clean:
+            return self.view[self.starts[p]:self.starts[end] - 1]
+        starts, ends, view = self.starts, self.ends, self.view
+        return b",".join(view[starts[i]:ends[i]] for i in range(p, end))
+
+    def lookup(self, p, k, word_range=None):
+        n = self.n
+        if p < 0 or p >= n:
+            return [EOF_LINE], True
+        end = min(p + k, n)
+        eof = end >= n
+        if end <= p:
+            return [EOF_LINE if eof else NEWLINE], eof
+        word_range = word_range or self.word_range
+        if not eof:
+            return [word_range(p, end), NEWLINE], False
+        # the sentinel is not in the file
+        if end - 1 > p:
+            return [word_range(p, end - 1), b",", EOF_EOF_TAIL], True
+        return [EOF_EOF_TAIL], True
+
+
+class SendfileCorpus(MmapCorpus):
+    # an mmap corpus that can also hand out a range as a FileRange of the
+    # words file itself, which the select server sends with os.sendfile
+    # straight from the page cache. Only the framing is written from user
+    # space. Needs a clean file, where words p..end-1 are the bytes
+    # starts[p]..starts[end] - 2; otherwise sendfile stays False and ranges
+    # are joined from the mapping as in mmap mode. Ranges shorter than
+    # min_bytes are still slices of the mapping: for those one sendmsg is
+    # cheaper than the extra sendfile call.
+
+    def __init__(self, filename, min_bytes=SENDFILE_MIN_BYTES):
+        super().__init__(filename)
+        self.file = open(filename, "rb")
+        self.sendfile = self.clean
+        self.min_bytes = min_bytes
+
+    def file_range(self, p, end):
+        start = self.starts[p]
+        count = self.starts[end] - 1 - start
+        if count < self.min_bytes:
+            return self.view[start:start + count]
+        return FileRange(self.file, start, count)
+
+    def file_lookup(self, p, k):
+        return self.lookup(p, k, self.file_range)
+
+    def file_payload(self, p, k):
+        return self.payload(p, k, self.file_range)
+
+
+class IdsCorpus(BaseCorpus):
+    # dictionary-encoded: only the sidecar's uint32 word ids plus the vocabulary
+    # are kept, 4 bytes per word instead of the text and its offsets. Ranges
+    # are materialized by joining vocabulary entries. With cache_blocks > 0 the
+    # last cache_blocks materialized blocks of CACHE_BLOCK words are kept (LRU),
+    # each as its joined bytes plus word offsets, so a hot range becomes slices
+    # of cached blocks. Word n-1 is the EOF sentinel, it is not stored.
+
+    CACHE_BLOCK = 1024
+
+    def __init__(self, index, cache_blocks=0):
+        self.index = index
+        self.ids = index.ids
+        self.n = index.nwords + 1
+        self.cache_blocks = cache_blocks
+        self.blocks = OrderedDict()
+
+    def join(self, p, end):
+        vocab = self.vocab()
+        return b",".join([vocab[i] for i in self.ids[p:end]])
+
+    def block(self, b):
+        # -> (joined words, offsets) of block b, offsets[i] is where word i starts
+        cached = self.blocks.get(b)
+        if cached is not None:
+            try:
+                self.blocks.move_to_end(b)
+            except KeyError:
+                # evicted meanwhile by a response built in another thread
+                pass
+            return cached
+        vocab = self.vocab()
+        words = [vocab[i] for i in self.ids[b * self.CACHE_BLOCK:(b + 1) * self.CACHE_BLOCK]]
+        offsets = array('I', accumulate([len(w) + 1 for w in words], initial=0))
+        cached = self.blocks[b] = (b",".join(words), offsets)
+        while len(self.blocks) > self.cache_blocks:
+            try:
+                self.blocks.popitem(last=False)
+            except KeyError:
+                break
+        return cached
+
+    def word_range(self, p, end):
+        if not self.cache_blocks:
+            return self.join(p, end)
+        size = self.CACHE_BLOCK
+        parts = []
+        for b in range(p // size, (end - 1) // size + 1):
+            blob, offsets = self.block(b)
+            lo = max(p - b * size, 0)
+            hi = min(end - b * size, size)
+            parts.append(memoryview(blob)[offsets[lo]:offsets[hi] - 1])
+        return parts[0] if len(parts) == 1 else b",".join(parts)
+
+    # the sentinel is not stored, same as for a mapped file
+    lookup = MmapCorpus.lookup
+
+
+def load_corpus(filename="words.txt", mode="blob", count_block=COUNT_BLOCK, cache_blocks=0,
+                sendfile_min_bytes=SENDFILE_MIN_BYTES, count_index=False):
+    # "blob": whole corpus in memory, "mmap": served from a mapping of the file,
+    # "sendfile": mmap plus os.sendfile of the file for plain text and binary
+    # ranges, "ids": dictionary-encoded word ids, responses built on demand.
+    # All start from the compiled sidecar, compiling it on first use.
+    if mode == "mmap":
+        corpus = MmapCorpus(filename)
+    elif mode == "sendfile":
+        corpus = SendfileCorpus(filename, sendfile_min_bytes)
+    elif mode == "ids":
+        with open(filename, "rb") as f:
+            corpus = IdsCorpus(open_index(filename, map_file(f)), cache_blocks)
+    else:
+        with open(filename, "rb") as f:
+            data = f.read()
+        corpus = Corpus.from_index(data, open_index(filename, data))
+    corpus.count_block = count_block
+    if count_index:
+        corpus.build_counter()
+    return corpus
+
+
+def corpus_from_config(cfg):
+    # the corpus a server config asks for
+    corpus = load_corpus(cfg.get("filename", "words.txt"), cfg.get("corpus_mode", "blob"),
+                         int(cfg.get("count_block", COUNT_BLOCK)), int(cfg.get("ids_cache_blocks", 0)),
+                         int(cfg.get("sendfile_min_bytes", SENDFILE_MIN_BYTES)),
+                         bool(cfg.get("count_index", False)))
+    # LRU of encoded responses, sized in bytes, 0 disables it
+    cache_bytes = int(cfg.get("response_cache_bytes", 0))
+    if cache_bytes:
+        corpus.cache = ResponseCache(cache_bytes)
+    return corpus
+
+
+def parse_request(line):
+    # b"p,k" -> (p, k), None when malformed
+    try:
+        p_str, k_str = line.split(b",")
+        return int(p_str), int(k_str)
+    except Exception:
+        return None
+
+
+def process_request(line, corpus, sendfile=False):
+    line = line.strip()
+    req = parse_request(line) if line else None
+    if req is None:
+        return [EOF_LINE], True
+    if sendfile and corpus.sendfile:
+        return corpus.file_lookup(*req)
+    if corpus.cache is not None:
+        return corpus.cache.lookup(corpus, *req)
+    return corpus.lookup(*req)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Compiled corpus sidecar (words.txt -> words.txt.corpus).
+#
+#   python3 ../common/corpus_cache.py words.txt
+#
+# Layout, every section 8 byte aligned, little endian:
+#   header         see HEADER below
+#   vocab_offsets  uint64[nvocab + 1]  into vocab_blob
+#   vocab_blob     utf-8 bytes of every distinct word, in id order
+#   ids            uint32[nwords]      word id of every occurrence
+#   starts         uint64[nwords + 1]  byte offset of every word in words.txt,
+#                                      starts[nwords] is one past the last word
+#   ends           uint64[nwords]      only when the file is not "clean"
+#
+# A file is clean when every separator between two words is a single comma,
+# then word i spans starts[i]..starts[i + 1] - 1 and ends is omitted.
+# The sidecar is trusted when the source size and mtime match; if only the
+# mtime changed the source is hashed and compared with the stored sha256,
+# and on a match the new mtime is written to the header.
+import os
+import re
+import sys
+import mmap
+import struct
+import hashlib
+from array import array
+
+MAGIC = b"WCORPUS1"
+# magic, src size, src mtime_ns, src sha256, nwords, nvocab, vocab bytes, clean
+HEADER = struct.Struct("<8sQQ32sQQQQ")
+MTIME = struct.Struct("<Q")
+MTIME_OFFSET = struct.calcsize("<8sQ")
+
+# a word as load_words sees it: no commas or newlines, surrounding blanks stripped
+WORD_RE = re.compile(rb"[^,\s](?:[^,\n]*[^,\s])?")
+
+
+class CorpusIndex:
+    def __init__(self, starts, ends, clean, ids, vocab_offsets, vocab_blob):
+        self.starts = starts
+        self.ends = ends
+        self.clean = clean
+        self.ids = ids
+        self.vocab_offsets = vocab_offsets
+        self.vocab_blob = vocab_blob
+        self.nwords = len(ids)
+
+    def vocab(self):
+        # distinct words as bytes, list index == word id
+        offs, blob = self.vocab_offsets, self.vocab_blob
+        return [bytes(blob[offs[i]:offs[i + 1]]) for i in range(len(offs) - 1)]
+
+
+def sidecar_path(filename):
+    return filename + ".corpus"
+
+
+def map_file(f):
+    size = os.fstat(f.fileno()).st_size
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+
+def build(data):
+    starts = array('Q')
+    ends = array('Q')
+    ids = array('I')
+    vocab = {}
+    clean = True
+    prev_end = None
+    for m in WORD_RE.finditer(data):
+        s, e = m.span()
+        if prev_end is not None and (s != prev_end + 1 or data[prev_end] != 44):  # 44 == ord(",")
+            clean = False
+        starts.append(s)
+        ends.append(e)
+        w = m.group()
+        wid = vocab.get(w)
+        if wid is None:
+            wid = vocab[w] = len(vocab)
+        ids.append(wid)
+        prev_end = e
+    starts.append(prev_end + 1 if prev_end is not None else 0)
+
+    vocab_offsets = array('Q', [0])
+    for w in vocab:
+        vocab_offsets.append(vocab_offsets[-1] + len(w))
+    vocab_blob = b"".join(vocab)
+    return CorpusIndex(starts, None if clean else ends, clean, ids, vocab_offsets, vocab_blob)
+
+
+def pad8(f, n):
+    if n % 8:
+        f.write(b"\0" * (8 - n % 8))
+
+
+def save(path, st, digest, index):
+    # best effort: a read-only directory just means compiling again next start
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, st.st_size, st.st_mtime_ns, digest, index.nwords,
+                                len(index.vocab_offsets) - 1, len(index.vocab_blob), int(index.clean)))
+            index.vocab_offsets.tofile(f)
+            f.write(index.vocab_blob)
+            pad8(f, len(index.vocab_blob))
+            index.ids.tofile(f)
+            pad8(f, 4 * index.nwords)
+            index.starts.tofile(f)
+            if not index.clean:
+                index.ends.tofile(f)
+        os.replace(tmp, path)
+        return True
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def touch(path, st):
+    # best effort as in save(); only the mtime field changes, in place
+    try:
+        with open(path, "r+b") as f:
+            f.seek(MTIME_OFFSET)
+            f.write(MTIME.pack(st.st_mtime_ns))
+    except OSError:
+        pass
+
+
+def load(path, st, data):
+    # -> CorpusIndex backed by a read-only mapping of the sidecar, None if stale/missing
+    try:
+        with open(path, "rb") as f:
+            mm = map_file(f)
+    except (OSError, ValueError):
+        return None
+    if len(mm) < HEADER.size:
+        return None
+    magic, size, mtime_ns, digest, nwords, nvocab, vocab_bytes, clean = HEADER.unpack_from(mm)
+    if magic != MAGIC or size != st.st_size:
+        return None
+    if mtime_ns != st.st_mtime_ns:
+        if hashlib.sha256(data).digest() != digest:
+            return None
+        # same contents under a new mtime (touched, copied): skip the hash next start
+        touch(path, st)
+
+    view = memoryview(mm)
+    pos = HEADER.size
+
+    def take(fmt, count, width):
+        nonlocal pos
+        section = view[pos:pos + count * width].cast(fmt)
+        pos += (count * width + 7) // 8 * 8
+        return section
+
+    try:
+        vocab_offsets = take('Q', nvocab + 1, 8)
+        vocab_blob = take('B', vocab_bytes, 1)
+        ids = take('I', nwords, 4)
+        starts = take('Q', nwords + 1, 8)
+        ends = None if clean else take('Q', nwords, 8)
+    except TypeError:
+        return None
+    if len(starts) != nwords + 1 or (ends is not None and len(ends) != nwords):
+        return None
+    return CorpusIndex(starts, ends, bool(clean), ids, vocab_offsets, vocab_blob)
+
+
+def compile_corpus(filename, data=None):
+    with open(filename, "rb") as f:
+        st = os.fstat(f.fileno())
+        if data is None:
+            data = map_file(f)
+    index = build(data)
+    save(sidecar_path(filename), st, hashlib.sha256(data).digest(), index)
+    return index
+
+
+def open_index(filename, data):
+    # load the sidecar for filename, compiling it first when missing or stale
+    st = os.stat(filename)
+    index = load(sidecar_path(filename), st, data)
+    if index is None:
+        index = compile_corpus(filename, data)
+    return index
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"usage: {sys.argv[0]} words.txt [...]")
+        return 1
+    for filename in sys.argv[1:]:
+        index = compile_corpus(filename)
+        print(f"{sidecar_path(filename)}: {index.nwords} words, "
+              f"{len(index.vocab_offsets) - 1} distinct, clean={index.clean}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
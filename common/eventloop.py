@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+import os
+import time
+import errno
+import selectors
+import socket
+from collections import deque
+from itertools import islice, takewhile
+
+from common.timerwheel import TimerWheel
+
+EVENT_READ = selectors.EVENT_READ
+EVENT_WRITE = selectors.EVENT_WRITE
+# seconds a listener stays unregistered after accept() ran out of fds or memory
+ACCEPT_RETRY = 0.1
+# accept() errors that only concern the connection being accepted
+ACCEPT_TRANSIENT = {errno.ECONNABORTED, errno.EPROTO, errno.ECONNRESET, errno.EPERM, errno.ENETDOWN,
+                    errno.ENETUNREACH, errno.EHOSTDOWN, errno.EHOSTUNREACH, errno.ENOPROTOOPT, errno.EOPNOTSUPP,
+                    errno.ETIMEDOUT}
+# fds of listeners accept_all has unregistered for ACCEPT_RETRY
+backing_off = set()
+
+
+class EventLoop:
+    # thin wrapper over selectors.DefaultSelector (epoll on linux)
+    # every registered fd carries a handler(mask) callback, so dispatch and
+    # removal are O(1) in the number of connections. Timers (call_later) live
+    # in a hashed timer wheel, also O(1) to add or cancel.
+
+    def __init__(self):
+        self.sel = selectors.DefaultSelector()
+        self.timers = TimerWheel()
+
+    def call_later(self, delay, callback, *args):
+        # -> timer handle for cancel()
+        return self.timers.schedule(delay, callback, *args)
+
+    def cancel(self, timer):
+        self.timers.cancel(timer)
+
+    def register(self, sock, events, handler):
+        self.sel.register(sock, events, handler)
+
+    def modify(self, sock, events, handler=None):
+        key = self.sel.get_key(sock)
+        if handler is None:
+            handler = key.data
+        if key.events != events or key.data is not handler:
+            self.sel.modify(sock, events, handler)
+
+    def unregister(self, sock):
+        try:
+            self.sel.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+
+    def run_once(self, timeout=None):
+        for key, mask in self.sel.select(self.timers.timeout(timeout)):
+            key.data(mask)
+        self.timers.advance()
+
+    def close(self):
+        self.sel.close()
+
+
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+HIGH_WATER = 256 * 1024
+LOW_WATER = 64 * 1024
+
+TCP_CORK = getattr(socket, "TCP_CORK", None)
+
+
+class FileRange:
+    # count bytes of an open file from offset. Queued like any other buffer,
+    # but sent with os.sendfile, so the bytes never pass through user space.
+    # Holds the file object, not its fd, so a reload cannot close it under us.
+    __slots__ = ("file", "offset", "count")
+
+    def __init__(self, file, offset, count):
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+
+def is_buffer(b):
+    return type(b) is not FileRange
+
+
+class IOStats:
+    # process wide syscall counters, servers bump `requests` themselves
+    __slots__ = ("requests", "recv_calls", "send_calls")
+
+    def __init__(self):
+        self.requests = 0
+        self.recv_calls = 0
+        self.send_calls = 0
+
+    def __str__(self):
+        per_req = (self.recv_calls + self.send_calls) / self.requests if self.requests else 0.0
+        return (f"requests={self.requests} recv_calls={self.recv_calls} "
+                f"send_calls={self.send_calls} syscalls_per_request={per_req:.3f}")
+
+
+io_stats = IOStats()
+
+
+class Connection:
+    # per-client state plus a non-blocking write path: responses are queued
+    # as buffers and drained with sendmsg whenever the socket is writable.
+    # Once more than high_water bytes are queued the connection is "paused":
+    # it stops reading (and schedulers stop serving it) until the queue drains
+    # below low_water, when on_drain(conn) is called.
+    # close_when_flushed() closes gracefully: once the queue is sent the write
+    # side is shut down and anything the client still sends is discarded
+    # until it closes too ("lingering"), since closing with unread input would
+    # reset the connection and could destroy the last response in flight.
+    # last_active is the time of the last byte received or sent, for idle timeouts.
+    __slots__ = ("sock", "fd", "addr", "codec", "corpus", "pending", "arrived", "closed", "loop", "events",
+                 "on_read", "on_close", "on_drain", "out", "out_bytes", "paused", "closing",
+                 "lingering", "high_water", "low_water", "last_active", "partial_since", "timer",
+                 "sendfile")
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.addr = addr
+        self.codec = None
+        # corpus snapshot this client is served from, fixed for its lifetime
+        self.corpus = None
+        self.pending = deque()
+        # arrival time of every pending request, for the queueing delay metric
+        self.arrived = deque()
+        self.closed = False
+        self.loop = None
+        self.events = 0
+        self.on_read = self.on_close = self.on_drain = None
+        self.out = deque()
+        self.out_bytes = 0
+        self.paused = False
+        self.closing = False
+        self.lingering = False
+        self.high_water = HIGH_WATER
+        self.low_water = LOW_WATER
+        self.last_active = time.monotonic()
+        # when the client started a request it has not finished, 0 if none
+        self.partial_since = 0
+        # responses may hold FileRanges
+        self.sendfile = False
+        # the connection's timeout check on the loop's timer wheel
+        self.timer = None
+
+    def attach(self, loop, on_read, on_close=None, on_drain=None,
+               high_water=HIGH_WATER, low_water=LOW_WATER):
+        self.loop = loop
+        self.on_read = on_read
+        self.on_close = on_close
+        self.on_drain = on_drain
+        self.high_water = high_water
+        self.low_water = low_water
+        self.events = EVENT_READ
+        loop.register(self.sock, EVENT_READ, self.handle_event)
+
+    def handle_event(self, mask):
+        if self.lingering:
+            self.discard_input()
+            return
+        if mask & EVENT_WRITE:
+            self.send_queued()
+            if self.closed:
+                return
+            if self.paused and self.out_bytes <= self.low_water:
+                self.paused = False
+                self.update_events()
+                if self.on_drain is not None:
+                    self.on_drain(self)
+        if mask & EVENT_READ and not self.closed and not self.paused:
+            self.on_read(self)
+
+    def recv(self, size):
+        io_stats.recv_calls += 1
+        data = self.sock.recv(size)
+        self.last_active = time.monotonic()
+        return data
+
+    def recv_into(self, rbuf):
+        # straight into the connection's RecvBuffer -> bytes received
+        io_stats.recv_calls += 1
+        n = rbuf.recv_into(self.sock)
+        self.last_active = time.monotonic()
+        return n
+
+    def write(self, bufs):
+        # bufs may hold several responses, they leave in one sendmsg when possible
+        fast = not self.out and len(bufs) <= IOV_MAX
+        if fast:
+            # fast path: nothing queued, try to send it all right away
+            io_stats.send_calls += 1
+            try:
+                sent = self.sock.sendmsg(bufs)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except TypeError:
+                # a FileRange is not a buffer, these go through the queue
+                io_stats.send_calls -= 1
+                fast = False
+            except OSError:
+                self.close()
+                return
+        if fast:
+            if sent:
+                self.last_active = time.monotonic()
+            for b in bufs:
+                if sent >= len(b):
+                    sent -= len(b)
+                    continue
+                self.out.append(memoryview(b)[sent:])
+                self.out_bytes += len(b) - sent
+                sent = 0
+            if not self.out:
+                return
+        else:
+            for b in bufs:
+                if len(b):
+                    self.out.append(memoryview(b) if is_buffer(b) else b)
+                    self.out_bytes += len(b)
+            self.send_queued()
+        if not self.closed and self.out_bytes > self.high_water:
+            self.paused = True
+        self.update_events()
+
+    def send_queued(self):
+        out = self.out
+        # with file ranges a response leaves in several calls (sendfile for
+        # the words, sendmsg for the framing around them); corked, the kernel
+        # sends full segments and pushes the rest when uncorked
+        cork = (self.sendfile and TCP_CORK is not None and len(out) > 1
+                and not all(map(is_buffer, out)))
+        try:
+            if cork:
+                self.sock.setsockopt(socket.IPPROTO_TCP, TCP_CORK, 1)
+            while out:
+                io_stats.send_calls += 1
+                head = out[0]
+                if not is_buffer(head):
+                    sent = os.sendfile(self.fd, head.file.fileno(), head.offset, head.count)
+                    if not sent:
+                        raise OSError(errno.EIO, "file shorter than its index")
+                    self.out_bytes -= sent
+                    self.last_active = time.monotonic()
+                    head.offset += sent
+                    head.count -= sent
+                    if not head.count:
+                        out.popleft()
+                    continue
+                if self.sendfile:
+                    bufs = list(takewhile(is_buffer, islice(out, IOV_MAX)))
+                else:
+                    bufs = list(islice(out, IOV_MAX))
+                sent = self.sock.sendmsg(bufs)
+                self.out_bytes -= sent
+                self.last_active = time.monotonic()
+                while sent:
+                    head = out[0]
+                    if sent >= len(head):
+                        sent -= len(head)
+                        out.popleft()
+                    else:
+                        out[0] = head[sent:]
+                        sent = 0
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self.close()
+            return
+        if cork:
+            try:
+                self.sock.setsockopt(socket.IPPROTO_TCP, TCP_CORK, 0)
+            except OSError:
+                self.close()
+                return
+        if not out and self.closing:
+            self.linger()
+        else:
+            self.update_events()
+
+    def close_when_flushed(self):
+        # stop reading requests, close once everything queued has been sent
+        self.closing = True
+        if not self.out:
+            self.linger()
+        else:
+            self.update_events()
+
+    def linger(self):
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            self.close()
+            return
+        self.lingering = True
+        self.update_events()
+
+    def discard_input(self):
+        try:
+            data = self.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.close()
+
+    def update_events(self):
+        if self.closed or self.loop is None:
+            return
+        events = 0
+        if (not self.paused and not self.closing) or self.lingering:
+            events |= EVENT_READ
+        if self.out:
+            events |= EVENT_WRITE
+        if events != self.events:
+            if events:
+                if self.events:
+                    self.loop.modify(self.sock, events, self.handle_event)
+                else:
+                    self.loop.register(self.sock, events, self.handle_event)
+            else:
+                self.loop.unregister(self.sock)
+            self.events = events
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.loop is not None:
+            if self.events:
+                self.loop.unregister(self.sock)
+            if self.timer is not None:
+                self.loop.cancel(self.timer)
+                self.timer = None
+        self.events = 0
+        self.out.clear()
+        self.out_bytes = 0
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+        if self.on_close is not None:
+            self.on_close(self)
+
+
+def make_listener(ip, port, backlog=128, reuse_port=False):
+    # reuse_port: several processes listen on the same port, the kernel
+    # balances incoming connections between them
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    srv.bind((ip, port))
+    srv.listen(backlog)
+    srv.setblocking(False)
+    return srv
+
+
+def resume_accepting(loop, srv, handler):
+    # a draining worker may have closed the listener meanwhile
+    if srv.fileno() >= 0:
+        loop.register(srv, EVENT_READ, handler)
+
+
+def accept_all(loop, srv, handler, logger):
+    # drain the accept queue in one readiness event. A connection that died
+    # before it was accepted only loses itself. When fds or memory run out
+    # the listener would stay readable and the loop would spin, so it is
+    # unregistered and put back (with handler) ACCEPT_RETRY seconds later;
+    # the rest wait in the backlog meanwhile. Neither stops the server.
+    conns = []
+    while True:
+        try:
+            conn, addr = srv.accept()
+        except (BlockingIOError, InterruptedError):
+            break
+        except OSError as e:
+            if e.errno in ACCEPT_TRANSIENT:
+                logger.info("accept_error", e.strerror)
+                continue
+            # EMFILE, ENFILE, ENOBUFS, ENOMEM or unknown, logged once until accepting works again
+            if srv.fileno() not in backing_off:
+                backing_off.add(srv.fileno())
+                logger.warning("accept_paused", e.strerror, ACCEPT_RETRY)
+            loop.unregister(srv)
+            loop.call_later(ACCEPT_RETRY, resume_accepting, loop, srv, handler)
+            return conns
+        conn.setblocking(False)
+        # responses are already coalesced per write; a scheduler that writes
+        # one small response per turn must not wait on Nagle + delayed ACK
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conns.append(Connection(conn, addr))
+    backing_off.discard(srv.fileno())
+    return conns
+
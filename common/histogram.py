@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+from array import array
+from collections import Counter
+
+COUNT_BLOCK = 4096
+# upper bound on stored counters (blocks * vocabulary); big vocabularies get
+# bigger blocks instead of more memory
+MAX_CELLS = 1 << 25
+
+
+class RangeCounter:
+    # word histogram of any id range in O(vocab + block).
+    # cum holds one cumulative histogram per block boundary, flattened:
+    # cum[b * V + w] = occurrences of word id w in ids[0 : b * block].
+    # A range is the difference of two boundary histograms plus the loose
+    # ends before the first and after the last boundary it covers.
+
+    def __init__(self, ids, nvocab, block=COUNT_BLOCK):
+        n = len(ids)
+        block = max(1, block, -(-n * max(nvocab, 1) // MAX_CELLS))
+        self.ids = ids
+        self.nvocab = nvocab
+        self.block = block
+        running = array('Q', bytes(8 * nvocab))
+        cum = array('Q', running)
+        for start in range(0, n - n % block, block):
+            for w, c in Counter(ids[start:start + block]).items():
+                running[w] += c
+            cum.extend(running)
+        self.cum = cum
+
+    def counts(self, p, end):
+        # -> {word id: count} over ids[p:end]
+        ids, block, v = self.ids, self.block, self.nvocab
+        end = min(end, len(ids))
+        if p >= end:
+            return {}
+        first = -(-p // block)
+        last = end // block
+        if first >= last:
+            return dict(Counter(ids[p:end]))
+        cum = self.cum
+        hi, lo = last * v, first * v
+        hist = {w: cum[hi + w] - cum[lo + w] for w in range(v) if cum[hi + w] != cum[lo + w]}
+        for w, c in Counter(ids[p:first * block]).items():
+            hist[w] = hist.get(w, 0) + c
+        for w, c in Counter(ids[last * block:end]).items():
+            hist[w] = hist.get(w, 0) + c
+        return hist
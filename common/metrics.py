@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# Server metrics: counters, gauges and histograms with power-of-two buckets,
+# rendered in the Prometheus text format (for the stats port) or as JSON (dumped
+# at exit). Recording is an attribute bump or a bisect, cheap enough to run on
+# every request.
+import json
+from bisect import bisect_left
+
+
+def log_buckets(first, count):
+    # upper bounds first, 2*first, 4*first, ... (count of them, +Inf is implicit)
+    return [first * 2 ** i for i in range(count)]
+
+
+# 1 us .. ~8 s for times, 1 .. 65536 for queue depths
+TIME_BUCKETS = log_buckets(1e-6, 24)
+DEPTH_BUCKETS = log_buckets(1, 17)
+INF = float("inf")
+
+
+def json_bound(bound):
+    return "+Inf" if bound == INF else bound
+
+
+class Counter:
+    __slots__ = ("value", "fn")
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+
+    def read(self):
+        return self.fn() if self.fn is not None else self.value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        # -> [(upper bound, observations <= bound)], the last bound is inf
+        out = []
+        total = 0
+        for bound, n in zip(self.bounds + [INF], self.counts):
+            total += n
+            out.append((bound, total))
+        return out
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+        return INF
+
+
+class Metrics:
+    def __init__(self, prefix="wordsrv"):
+        self.prefix = prefix
+        self.entries = []  # (type, name, help, Counter or Histogram)
+
+    def add(self, kind, name, help, metric):
+        self.entries.append((kind, f"{self.prefix}_{name}", help, metric))
+        return metric
+
+    def counter(self, name, help, fn=None):
+        return self.add("counter", name, help, Counter(fn))
+
+    def gauge(self, name, help, fn):
+        # gauges are read from fn when rendered, nothing to update
+        return self.add("gauge", name, help, Counter(fn))
+
+    def histogram(self, name, help, bounds=TIME_BUCKETS):
+        return self.add("histogram", name, help, Histogram(bounds))
+
+    def render(self):
+        lines = []
+        for kind, name, help, metric in self.entries:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for bound, total in metric.cumulative():
+                    le = "+Inf" if bound == INF else f"{bound:g}"
+                    lines.append(f'{name}_bucket{{le="{le}"}} {total}')
+                lines.append(f"{name}_sum {metric.sum:g}")
+                lines.append(f"{name}_count {metric.count}")
+            else:
+                lines.append(f"{name} {metric.read():g}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        out = {}
+        for kind, name, help, metric in self.entries:
+            if kind == "histogram":
+                out[name] = {
+                    "buckets": [[json_bound(b), n] for b, n in metric.cumulative()],
+                    "sum": metric.sum,
+                    "count": metric.count,
+                    "p50": json_bound(metric.quantile(0.5)),
+                    "p99": json_bound(metric.quantile(0.99)),
+                }
+            else:
+                out[name] = metric.read()
+        return out
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def http_response(body):
+    # minimal HTTP/1.0 reply for a Prometheus scrape (or curl)
+    body = body.encode()
+    head = (f"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode()
+    return [head, body]
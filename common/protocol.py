@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# Wire codecs for the word server. Text and binary clients share one port:
+# the first byte of a connection decides which codec serves it.
+#
+# Text (default): request "p,k\n", response "w1,w2,...\n" / "...,EOF\n".
+#
+# Binary: the client opens with the 4 byte preamble NUL 'W' 'B' <options>.
+# Text requests never start with NUL, so this is unambiguous.
+#   request   !BQI   op, p, k                       (13 bytes)
+#   response  !BI    flags, payload length, then the payload
+# op RANGE returns words p..p+k-1 comma joined, without the EOF sentinel;
+# F_EOF is set once the range reaches the end of the corpus (the server then
+# closes the connection, as in text mode). With OPT_IDS the payload is
+# instead the uint32 little endian word ids, and the server's first frame is
+# the vocabulary (F_VOCAB, comma joined, list position == word id).
+#
+# COUNT: text "COUNT p,k\n" / binary op COUNT returns the word histogram of
+# words p..p+k-1 instead of the words themselves, "w1:c1,w2:c2,...\n" (as the
+# payload of an F_COUNTS frame in binary; with OPT_IDS the payload is packed
+# <IQ word id / count pairs). A COUNT never closes the connection.
+#
+# Compression (opt-in): binary clients set OPT_ZLIB in the options byte, text
+# clients send "ZLIB\n" as their first request and wait for the plain "ZLIB\n"
+# acknowledgement. Everything the server sends afterwards is one zlib stream
+# per connection, sync flushed after every response so it can be decoded at
+# once while the dictionary carries over between responses.
+#
+# Requests are framed straight from bytes: each connection owns a RecvBuffer
+# that recv_into fills in place, only bytes not searched before are looked at
+# for a newline and binary frames are unpacked from whole multiples of the
+# frame size, so nothing is decoded or rescanned however requests are split.
+import zlib
+import struct
+from array import array
+from collections import Counter
+
+from common.corpus import process_request, parse_request, EOF_LINE
+
+PREAMBLE = b"\x00WB"
+OPT_IDS = 1
+OPT_ZLIB = 2
+
+ZLIB_LINE = b"ZLIB"
+# the data is mostly repeated words, level 1 already gets most of the ratio
+ZLIB_LEVEL = 1
+
+OP_RANGE = 1
+OP_VOCAB = 2
+OP_COUNT = 3
+
+REQUEST = struct.Struct("!BQI")
+RESPONSE = struct.Struct("!BI")
+
+F_EOF = 1
+F_IDS = 2
+F_VOCAB = 4
+F_COUNTS = 8
+
+COUNT_PAIR = struct.Struct("<IQ")
+# k of a COUNT that should cover everything from p on
+COUNT_ALL = 0xFFFFFFFF
+
+RECV_SIZE = 4096
+# a text request line longer than this is malformed, not a partial request
+MAX_LINE = 65536
+
+
+def encode_counts(hist, corpus):
+    vocab = corpus.vocab()
+    return b",".join(vocab[w] + b":" + str(c).encode() for w, c in hist.items())
+
+
+def compress(compressor, bufs, eof):
+    # -> bufs as one sync flushed chunk of the connection's stream, the
+    # stream is finished with the last response
+    data = b"".join([compressor.compress(b) for b in bufs])
+    return [data + compressor.flush(zlib.Z_FINISH if eof else zlib.Z_SYNC_FLUSH)]
+
+
+def decode_counts(payload, vocab=None):
+    # inverse of encode_counts / the packed id pairs when vocab is given
+    if vocab is not None:
+        return Counter({vocab[w]: c for w, c in COUNT_PAIR.iter_unpack(payload)})
+    counts = Counter()
+    for item in payload.decode('utf-8').split(","):
+        if item:
+            w, c = item.rsplit(":", 1)
+            counts[w] = int(c)
+    return counts
+
+
+class RecvBuffer:
+    # receive buffer of one connection: data[start:end] is received but not
+    # yet consumed, data[start:scan] is known to hold no newline. Consumed
+    # bytes are only reclaimed when the free tail gets too short for the next
+    # read, or for free once everything has been consumed.
+
+    def __init__(self, size=RECV_SIZE):
+        self.size = size
+        self.data = bytearray(size)
+        self.view = memoryview(self.data)
+        self.start = 0
+        self.end = 0
+        self.scan = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def resize(self, size):
+        # the view has to go before the bytearray can change size
+        self.view.release()
+        if size > len(self.data):
+            self.data.extend(bytes(size - len(self.data)))
+        else:
+            self.data = bytearray(size)
+        self.view = memoryview(self.data)
+
+    def reserve(self, n):
+        # make room for n more bytes after end
+        if self.start == self.end:
+            self.start = self.end = self.scan = 0
+            if len(self.data) > 16 * self.size:
+                # drop what a long line grew it to
+                self.resize(self.size)
+        if len(self.data) - self.end >= n:
+            return
+        used = self.end - self.start
+        if self.start:
+            # a copy: source and destination overlap
+            self.data[:used] = self.data[self.start:self.end]
+            self.scan -= self.start
+            self.start = 0
+            self.end = used
+        if len(self.data) - used < n:
+            self.resize(2 * max(n, len(self.data)))
+
+    def recv_into(self, sock, size=None):
+        # one recv straight into the free tail -> bytes received, 0 on EOF
+        size = size or self.size
+        if self.start == self.end or len(self.data) - self.end < size:
+            self.reserve(size)
+        n = sock.recv_into(self.view[self.end:self.end + size])
+        self.end += n
+        return n
+
+    def append(self, data):
+        n = len(data)
+        self.reserve(n)
+        self.data[self.end:self.end + n] = data
+        self.end += n
+
+    def take(self, n):
+        # -> the next n bytes, consumed
+        out = bytes(self.view[self.start:self.start + n])
+        self.start += n
+        return out
+
+    def skip(self):
+        self.start = self.scan = self.end
+
+    def lines(self):
+        # -> complete lines without their newline, consumed. Only the bytes
+        # after scan are searched, then everything up to the last newline is
+        # split in one go
+        end = self.end
+        pos = self.data.rfind(b"\n", self.scan, end)
+        self.scan = end
+        if pos < 0:
+            return []
+        out = bytes(self.view[self.start:pos]).split(b"\n")
+        self.start = pos + 1
+        return out
+
+
+class TextCodec:
+    binary = False
+
+    def __init__(self, sendfile=False):
+        self.compressor = None
+        # word ranges may come back as FileRanges
+        self.sendfile = sendfile
+
+    def parse(self, rbuf):
+        # -> complete, non-empty request lines (bytes)
+        reqs = [line for line in (l.strip() for l in rbuf.lines()) if line]
+        if rbuf.end - rbuf.start > MAX_LINE:
+            # never going to be a request, answer it as a malformed one
+            rbuf.skip()
+            reqs.append(b"?")
+        return reqs
+
+    def respond(self, req, corpus):
+        if req == ZLIB_LINE and self.compressor is None:
+            self.compressor = zlib.compressobj(ZLIB_LEVEL)
+            # the compressor needs the bytes
+            self.sendfile = False
+            return [b"ZLIB\n"], False
+        if req.startswith(b"COUNT "):
+            rng = parse_request(req[6:])
+            if rng is None:
+                return [EOF_LINE], True
+            return [encode_counts(corpus.range_counts(*rng), corpus), b"\n"], False
+        return process_request(req, corpus, self.sendfile)
+
+    def error(self):
+        return [EOF_LINE], True
+
+
+class BinaryCodec:
+    binary = True
+
+    def __init__(self, options=0, sendfile=False):
+        self.ids = bool(options & OPT_IDS)
+        self.compressor = zlib.compressobj(ZLIB_LEVEL) if options & OPT_ZLIB else None
+        self.sendfile = sendfile and self.compressor is None
+        # an ids client needs the vocabulary before anything else
+        self.greeting = [(OP_VOCAB, 0, 0)] if self.ids else []
+
+    def parse(self, rbuf):
+        # -> (op, p, k) tuples
+        reqs = self.greeting
+        self.greeting = []
+        whole = len(rbuf) - len(rbuf) % REQUEST.size
+        if whole:
+            reqs += REQUEST.iter_unpack(rbuf.take(whole))
+        return reqs
+
+    def respond(self, req, corpus):
+        op, p, k = req
+        if op == OP_VOCAB:
+            vocab = corpus.vocab_payload()
+            return [RESPONSE.pack(F_VOCAB, len(vocab)), vocab], False
+        if op == OP_COUNT:
+            hist = corpus.range_counts(p, k)
+            if self.ids:
+                payload = b"".join(COUNT_PAIR.pack(w, c) for w, c in hist.items())
+                return [RESPONSE.pack(F_COUNTS | F_IDS, len(payload)), payload], False
+            payload = encode_counts(hist, corpus)
+            return [RESPONSE.pack(F_COUNTS, len(payload)), payload], False
+        if op != OP_RANGE:
+            return [RESPONSE.pack(F_EOF, 0)], True
+        if self.ids:
+            bufs, eof = corpus.ids_payload(p, k)
+            flags = F_IDS
+        elif self.sendfile and corpus.sendfile:
+            bufs, eof = corpus.file_payload(p, k)
+            flags = 0
+        else:
+            bufs, eof = corpus.payload(p, k)
+            flags = 0
+        if eof:
+            flags |= F_EOF
+        return [RESPONSE.pack(flags, sum(len(b) for b in bufs))] + bufs, eof
+
+    def error(self):
+        return [RESPONSE.pack(F_EOF, 0)], True
+
+
+class AutoCodec:
+    # negotiates on the first bytes, then delegates to the text or binary codec
+
+    def __init__(self, sendfile=False):
+        # sendfile: the connection can send FileRanges (select server)
+        self.sendfile = sendfile
+        self.codec = None
+        self.rbuf = RecvBuffer()
+
+    def parse(self):
+        # -> the complete requests received into rbuf so far
+        rbuf = self.rbuf
+        if self.codec is not None:
+            return self.codec.parse(rbuf)
+        if not len(rbuf):
+            return []
+        if rbuf.data[rbuf.start] != 0:
+            self.codec = TextCodec(self.sendfile)
+        elif len(rbuf) < len(PREAMBLE) + 1:
+            return []
+        else:
+            head = rbuf.take(len(PREAMBLE) + 1)
+            if head[:len(PREAMBLE)] != PREAMBLE:
+                # unknown binary greeting, answer as a malformed text request
+                self.codec = TextCodec()
+                rbuf.skip()
+                return [b"?"]
+            self.codec = BinaryCodec(head[len(PREAMBLE)], self.sendfile)
+        return self.codec.parse(rbuf)
+
+    def feed(self, data):
+        # for callers that receive bytes objects (asyncio)
+        self.rbuf.append(data)
+        return self.parse()
+
+    def partial(self):
+        # True while the client has sent part of a request
+        return len(self.rbuf) > 0
+
+    def respond(self, req, corpus):
+        # the compressor is picked before answering, so the ZLIB acknowledgement goes out plain
+        compressor = self.codec.compressor
+        bufs, eof = self.codec.respond(req, corpus)
+        if compressor is not None:
+            bufs = compress(compressor, bufs, eof)
+        return bufs, eof
+
+    def error(self):
+        # closing answer when serving a request failed
+        codec = self.codec or TextCodec()
+        bufs, eof = codec.error()
+        if codec.compressor is not None:
+            bufs = compress(codec.compressor, bufs, eof)
+        return bufs, eof
+
+
+class BinaryClient:
+    # blocking client side of the binary protocol
+
+    def __init__(self, sock, ids=False, compress=False):
+        self.sock = sock
+        self.ids = ids
+        self.vocab = None
+        self.buf = bytearray()
+        self.inflater = zlib.decompressobj() if compress else None
+        sock.sendall(PREAMBLE + bytes([(OPT_IDS if ids else 0) | (OPT_ZLIB if compress else 0)]))
+
+    def send_ranges(self, ranges, op=OP_RANGE):
+        self.sock.sendall(b"".join(REQUEST.pack(op, p, k) for p, k in ranges))
+
+    def read_exact(self, n):
+        while len(self.buf) < n:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("server closed the connection")
+            if self.inflater is not None:
+                chunk = self.inflater.decompress(chunk)
+            self.buf += chunk
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+
+    def buffered(self):
+        # True when the next response is already received in full
+        buf = self.buf
+        return len(buf) >= RESPONSE.size and len(buf) >= RESPONSE.size + RESPONSE.unpack_from(buf)[1]
+
+    def read_response(self):
+        # -> (flags, payload) of the next range response
+        while True:
+            flags, length = RESPONSE.unpack(self.read_exact(RESPONSE.size))
+            payload = self.read_exact(length)
+            if flags & F_VOCAB:
+                self.vocab = payload.decode('utf-8').split(",")
+                continue
+            return flags, payload
+
+
+def start_zlib(sock):
+    # text side of the negotiation -> decompressor for everything after the ack
+    sock.sendall(b"ZLIB\n")
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(len(b"ZLIB\n") - len(data))
+        if not chunk:
+            break
+        data += chunk
+    if data != b"ZLIB\n":
+        raise ConnectionError("server does not support compression")
+    return zlib.decompressobj()
+
+
+def request_counts(sock, p, k, binary=False, ids=False, compress=False):
+    # one COUNT round trip -> Counter of word -> occurrences in words p..p+k-1
+    if binary:
+        client = BinaryClient(sock, ids=ids, compress=compress)
+        client.send_ranges([(p, k)], op=OP_COUNT)
+        flags, payload = client.read_response()
+        return decode_counts(payload, client.vocab if ids else None)
+    inflater = start_zlib(sock) if compress else None
+    sock.sendall(f"COUNT {p},{k}\n".encode())
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += inflater.decompress(chunk) if inflater else chunk
+    return decode_counts(data.strip())
+
+
+def count_payloads(payloads, vocab=None):
+    # word -> count over binary range payloads (word ids when vocab is given)
+    if vocab is not None:
+        ids = array('I')
+        for payload in payloads:
+            ids.frombytes(payload)
+        return Counter({vocab[i]: c for i, c in Counter(ids).items()})
+    counts = Counter()
+    for payload in payloads:
+        if payload:
+            counts.update(payload.decode('utf-8').split(","))
+    return counts
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# Token-bucket rate limits for server_core, in requests/s and/or bytes/s,
+# per connection or per source IP. A client over its budget is not dropped:
+# the core parks it and puts it back in the scheduler once wait() says its
+# buckets have refilled.
+import time
+
+# seconds of traffic a bucket can hold, the largest burst a client may send
+RATE_BURST = 0.1
+# idle per-IP buckets kept before the first prune
+PRUNE_MIN = 64
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = now
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait(self, need):
+        # seconds until the bucket holds `need` tokens
+        return max(0.0, (need - self.tokens) / self.rate)
+
+    def full(self, now):
+        return self.tokens + (now - self.stamp) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    # Responses are only sized once built, so a client may spend its byte
+    # tokens into debt; the debt then delays its next turn.
+    # Per-IP buckets outlive their connections, so a reconnect does not reset
+    # them. Once an IP has no connection left and its buckets have refilled
+    # they are the same as new ones and are dropped; prune() runs whenever
+    # the number of such idle IPs has doubled, so that stays O(1) amortized.
+
+    def __init__(self, requests_per_sec, bytes_per_sec, burst=RATE_BURST, by_ip=False):
+        self.rps = requests_per_sec
+        self.bps = bytes_per_sec
+        self.burst = burst
+        self.by_ip = by_ip
+        self.buckets = {}  # connection or source IP -> (request bucket, byte bucket)
+        self.live = {}  # source IP -> open connections, per IP only
+        self.idle = set()  # source IPs with buckets but no open connection
+        self.prune_at = PRUNE_MIN
+        self.deferred = 0
+
+    def key(self, conn):
+        return conn.addr[0] if self.by_ip else conn
+
+    def get(self, conn, now):
+        key = self.key(conn)
+        pair = self.buckets.get(key)
+        if pair is None:
+            pair = (TokenBucket(self.rps, max(1.0, self.rps * self.burst), now) if self.rps else None,
+                    TokenBucket(self.bps, self.bps * self.burst, now) if self.bps else None)
+            self.buckets[key] = pair
+        for bucket in pair:
+            if bucket is not None:
+                bucket.refill(now)
+        return pair
+
+    def wait(self, conn, now=None):
+        # -> seconds conn has to wait for its next request, 0 when it may go now
+        reqs, nbytes = self.get(conn, time.monotonic() if now is None else now)
+        wait = 0.0
+        if reqs is not None:
+            wait = reqs.wait(1)
+        if nbytes is not None and nbytes.tokens <= 0:
+            wait = max(wait, nbytes.wait(1))
+        if wait:
+            self.deferred += 1
+        return wait
+
+    def allowed(self, conn):
+        # requests conn may send right now, call after wait() returned 0
+        reqs, _ = self.buckets[self.key(conn)]
+        return int(reqs.tokens) if reqs is not None else float("inf")
+
+    def charge(self, conn, requests, nbytes):
+        reqs, byte_bucket = self.buckets[self.key(conn)]
+        if reqs is not None:
+            reqs.tokens -= requests
+        if byte_bucket is not None:
+            byte_bucket.tokens -= nbytes
+
+    def connect(self, conn):
+        if self.by_ip:
+            ip = conn.addr[0]
+            self.live[ip] = self.live.get(ip, 0) + 1
+            self.idle.discard(ip)
+
+    def forget(self, conn):
+        if not self.by_ip:
+            self.buckets.pop(conn, None)
+            return
+        ip = conn.addr[0]
+        left = self.live.pop(ip, 1) - 1
+        if left > 0:
+            self.live[ip] = left
+        elif ip in self.buckets:
+            self.idle.add(ip)
+            if len(self.idle) >= self.prune_at:
+                self.prune(time.monotonic())
+
+    def prune(self, now):
+        # drop the buckets of idle IPs that have refilled
+        for ip in [ip for ip in self.idle if all(b is None or b.full(now) for b in self.buckets[ip])]:
+            del self.buckets[ip]
+            self.idle.discard(ip)
+        self.prune_at = max(PRUNE_MIN, 2 * len(self.idle))
+
+    def __str__(self):
+        per = "ip" if self.by_ip else "connection"
+        return (f"rate limit per {per}: {self.rps:g} req/s {self.bps:g} B/s (0 = unlimited), "
+                f"deferred={self.deferred}")
+
+
+def limiter_from_config(cfg):
+    # None unless "rate_limit_rps" or "rate_limit_bps" is set
+    rps = float(cfg.get("rate_limit_rps", 0))
+    bps = float(cfg.get("rate_limit_bps", 0))
+    if not rps and not bps:
+        return None
+    by = cfg.get("rate_limit_by", "connection")
+    if by not in ("connection", "ip"):
+        raise ValueError(f"rate_limit_by must be 'connection' or 'ip', got {by!r}")
+    return RateLimiter(rps, bps, float(cfg.get("rate_limit_burst", RATE_BURST)), by == "ip")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import threading
+
+from common.corpus import corpus_from_config
+
+RELOAD_INTERVAL = 1.0
+
+
+class Reloader:
+    # watches the config file and the words file it names. On a change a new
+    # corpus is built in a background thread while the server keeps serving;
+    # poll(), called from the event loop, swaps it in once it is ready.
+    # Corpora are never modified after they are built, so connections that
+    # picked up the old one keep using it until they finish, new connections
+    # get the new one. Only corpus settings are reloaded, the listening
+    # address and the watermarks stay as they were at start.
+    # An mmap or sendfile corpus reads the words file itself, so that file
+    # must be replaced by a rename, never rewritten in place: a truncated
+    # mapping faults (SIGBUS) and sendfile fails. A change to the same inode
+    # the current corpus maps is not reloaded.
+    # Events go to `logger` (a RingLogger), which the server sets before it
+    # first polls.
+
+    def __init__(self, config_path, cfg, corpus, interval=RELOAD_INTERVAL):
+        self.config_path = config_path
+        self.cfg = cfg
+        self.corpus = corpus
+        self.interval = interval
+        self.stamp = self.stat(cfg)
+        self.next_check = time.monotonic() + interval
+        self.building = None
+        self.result = None
+        self.generation = 0
+        self.logger = None
+
+    def stat(self, cfg):
+        # (mtime_ns, size, dev, inode) of the config and the words file, None when missing
+        stamps = []
+        for path in (self.config_path, cfg.get("filename", "words.txt")):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size, st.st_dev, st.st_ino))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def build(self):
+        try:
+            with open(self.config_path, "r") as f:
+                cfg = json.load(f)
+            # taken before reading the words, a write during the build shows up as another change
+            stamp = self.stat(cfg)
+            self.result = (cfg, corpus_from_config(cfg), stamp)
+        except Exception as e:
+            # keeps the current corpus
+            self.logger.warning("reload_failed", f"{type(e).__name__}: {e}")
+            self.result = False
+
+    def poll(self):
+        # -> True when a new corpus was swapped in
+        if self.building is not None:
+            if self.result is None:
+                return False
+            result, self.result = self.result, None
+            self.building = None
+            if result:
+                self.cfg, self.corpus, self.stamp = result
+                self.generation += 1
+                self.logger.info("reloaded", self.cfg.get("filename", "words.txt"), len(self.corpus),
+                                 self.generation)
+                return True
+            return False
+        now = time.monotonic()
+        if not self.interval or now < self.next_check:
+            return False
+        self.next_check = now + self.interval
+        stamp = self.stat(self.cfg)
+        if stamp != self.stamp:
+            words, old, self.stamp = stamp[1], self.stamp[1], stamp
+            if words and words != old and words[2:] == self.corpus.mapped:
+                # replace it with a rename (write a temp file, then mv)
+                self.logger.warning("reload_refused", self.cfg.get("filename", "words.txt"),
+                                    "rewritten in place while mapped")
+                return False
+            self.building = threading.Thread(target=self.build, daemon=True)
+            self.building.start()
+        return False
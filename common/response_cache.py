@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    # pre-encoded text responses keyed by (p, k), evicting the least recently
+    # used once the cached bytes exceed max_bytes. The cache belongs to one
+    # corpus: asking it with a different corpus (a reload) drops everything.
+    # Safe to share with the offload threads; the lock is never held while a
+    # response is being built.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.corpus = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, corpus, p, k):
+        # same (bufs, eof) contract as corpus.lookup
+        key = (p, k)
+        with self.lock:
+            if corpus is not self.corpus:
+                self.clear()
+                self.corpus = corpus
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return [entry[0]], entry[1]
+            self.misses += 1
+        bufs, eof = corpus.lookup(p, k)
+        data = b"".join(bufs)
+        if len(data) <= self.max_bytes:
+            with self.lock:
+                if corpus is self.corpus and key not in self.entries:
+                    self.entries[key] = (data, eof)
+                    self.size += len(data)
+                    while self.size > self.max_bytes:
+                        _, (old, _) = self.entries.popitem(last=False)
+                        self.size -= len(old)
+                        self.evictions += 1
+        return [data], eof
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def __str__(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return (f"cache hits={self.hits} misses={self.misses} evictions={self.evictions} "
+                f"hit_rate={rate:.3f} entries={len(self.entries)} bytes={self.size}")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Event log for the servers that stays off the hot path: events are tuples
+# appended to an in-memory ring buffer and only formatted and written by a
+# background thread (every `interval` seconds, on SIGUSR1 and at exit). When
+# the buffer is full the oldest events are overwritten and counted as
+# dropped. Debug events (one per request) can be sampled: with sample=N only
+# every N-th one is kept.
+import sys
+import time
+import signal
+import threading
+from collections import deque
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {v: k.upper() for k, v in LEVELS.items()}
+
+LOG_BUFFER = 4096
+LOG_FLUSH_INTERVAL = 1.0
+
+
+class RingLogger:
+    def __init__(self, level=INFO, sample=1, capacity=LOG_BUFFER, out=None, interval=LOG_FLUSH_INTERVAL):
+        self.level = level
+        self.sample = max(1, sample)
+        self.buf = deque(maxlen=capacity)
+        self.out = out if out is not None else sys.stdout
+        self.interval = interval
+        self.seen = 0  # debug events offered, for sampling
+        self.dropped = 0
+        self.wake = threading.Event()
+        self.stopping = False
+        self.thread = None
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, event, *args):
+        # args are formatted at flush time, pass objects, not strings
+        if level < self.level:
+            return
+        if level == DEBUG and self.sample > 1:
+            self.seen += 1
+            if self.seen % self.sample:
+                return
+        buf = self.buf
+        if len(buf) == buf.maxlen:
+            self.dropped += 1
+        buf.append((time.time(), level, event, args))
+
+    def debug(self, event, *args):
+        self.log(DEBUG, event, *args)
+
+    def info(self, event, *args):
+        self.log(INFO, event, *args)
+
+    def warning(self, event, *args):
+        self.log(WARNING, event, *args)
+
+    def error(self, event, *args):
+        self.log(ERROR, event, *args)
+
+    def flush(self):
+        buf = self.buf
+        lines = []
+        while True:
+            try:
+                stamp, level, event, args = buf.popleft()
+            except IndexError:
+                break
+            fields = "".join(" " + (repr(a) if isinstance(a, (str, bytes)) else str(a)) for a in args)
+            lines.append(f"[srv] {stamp:.6f} {LEVEL_NAMES[level]} {event}{fields}\n")
+        if lines:
+            self.out.write("".join(lines))
+            self.out.flush()
+
+    def writer(self):
+        while not self.stopping:
+            self.wake.wait(self.interval or None)
+            self.wake.clear()
+            self.flush()
+
+    def start(self):
+        # writer thread plus SIGUSR1 -> flush now (main thread only)
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.wake.set())
+        return self
+
+    def close(self):
+        if self.thread is not None:
+            self.stopping = True
+            self.wake.set()
+            self.thread.join(1.0)
+            self.thread = None
+        if self.dropped:
+            self.warning("log_dropped", self.dropped)
+        self.flush()
+        if self.out is not sys.stdout:
+            self.out.close()
+
+
+def logger_from_config(cfg, default_level="info", start=True):
+    # "log_level", "log_sample", "log_buffer", "log_flush_interval", "log_file" ("-" = stdout)
+    # start=False: no writer thread, the caller flushes (a process that forks must not
+    # be in the middle of a write when it does)
+    name = cfg.get("log_level", default_level)
+    if name not in LEVELS:
+        raise ValueError(f"log_level must be one of {', '.join(LEVELS)}, got {name!r}")
+    path = cfg.get("log_file", "-")
+    out = sys.stdout if path == "-" else open(path, "a")
+    logger = RingLogger(LEVELS[name], int(cfg.get("log_sample", 1)), int(cfg.get("log_buffer", LOG_BUFFER)),
+                        out, float(cfg.get("log_flush_interval", LOG_FLUSH_INTERVAL)))
+    return logger.start() if start else logger
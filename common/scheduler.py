@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# Schedulers for server_core: they only decide which ready client is served
+# next and how much it may send in one turn, all socket I/O stays in the core.
+#
+# The core calls on_connect / on_close around a connection's lifetime,
+# enqueue(conn) when conn has pending requests and can be served (the core
+# makes sure a connection is queued at most once) and dequeue() -> conn to
+# pick the next turn. A turn serves at most budget(conn) requests; the
+# bytes actually sent are then reported with charge(conn, nbytes, idle).
+import heapq
+import random
+from collections import deque
+
+from common.corpus import parse_request
+
+# bytes of responses a client may receive per round in DRR mode
+DRR_QUANTUM = 8192
+UNLIMITED = float("inf")
+
+
+class Scheduler:
+    def __init__(self, cfg):
+        pass
+
+    def on_connect(self, conn):
+        pass
+
+    def on_close(self, conn):
+        pass
+
+    def enqueue(self, conn):
+        raise NotImplementedError
+
+    def dequeue(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def budget(self, conn):
+        # -> (max requests, max bytes) of conn's next turn
+        return 1, UNLIMITED
+
+    def charge(self, conn, nbytes, idle):
+        pass
+
+
+class FCFSScheduler(Scheduler):
+    # clients in the order their requests arrived, each turn answers
+    # everything the client has pending
+    def __init__(self, cfg):
+        self.queue = deque()
+
+    def enqueue(self, conn):
+        self.queue.append(conn)
+
+    def dequeue(self):
+        return self.queue.popleft() if self.queue else None
+
+    def __len__(self):
+        return len(self.queue)
+
+    def budget(self, conn):
+        return UNLIMITED, UNLIMITED
+
+
+class RRScheduler(FCFSScheduler):
+    # one request per client per round
+    def budget(self, conn):
+        return 1, UNLIMITED
+
+
+class DRRScheduler(FCFSScheduler):
+    # deficit round robin: every turn adds `quantum` bytes of credit and the
+    # client is charged the actual size of its responses, so clients share
+    # bandwidth rather than request count. Responses are only sized once
+    # built, a turn may overdraw and the debt carries into the next round.
+    def __init__(self, cfg):
+        super().__init__(cfg)
+        self.quantum = int(cfg.get("drr_quantum", DRR_QUANTUM))
+        self.deficit = {}  # Connection -> unused credit, negative when overdrawn
+
+    def on_close(self, conn):
+        self.deficit.pop(conn, None)
+
+    def budget(self, conn):
+        credit = self.deficit.get(conn, 0) + self.quantum
+        self.deficit[conn] = credit
+        return UNLIMITED, credit
+
+    def charge(self, conn, nbytes, idle):
+        credit = self.deficit.get(conn, 0) - nbytes
+        # an idle client keeps its debt but does not bank credit
+        self.deficit[conn] = min(credit, 0) if idle else credit
+
+
+def request_size(req):
+    # words asked for by a text b"p,k" / b"COUNT p,k" line or a binary (op, p, k) request
+    if isinstance(req, tuple):
+        return req[2]
+    parsed = parse_request(req[6:] if req.startswith(b"COUNT ") else req)
+    return parsed[1] if parsed else 0
+
+
+class SRFScheduler(Scheduler):
+    # shortest request first: the client whose oldest pending request asks for
+    # the fewest words goes next, ties in arrival order
+    def __init__(self, cfg):
+        self.heap = []
+        self.seq = 0
+
+    def enqueue(self, conn):
+        self.seq += 1
+        heapq.heappush(self.heap, (request_size(conn.pending[0]), self.seq, conn))
+
+    def dequeue(self):
+        return heapq.heappop(self.heap)[2] if self.heap else None
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class LotteryScheduler(Scheduler):
+    # every ready client holds one ticket, the next turn goes to a random one
+    def __init__(self, cfg):
+        self.ready = []
+        self.rng = random.Random(cfg.get("lottery_seed"))
+
+    def enqueue(self, conn):
+        self.ready.append(conn)
+
+    def dequeue(self):
+        ready = self.ready
+        if not ready:
+            return None
+        # swap the winner to the end so removal is O(1)
+        i = self.rng.randrange(len(ready))
+        ready[i], ready[-1] = ready[-1], ready[i]
+        return ready.pop()
+
+    def __len__(self):
+        return len(self.ready)
+
+
+SCHEDULERS = {
+    "fcfs": FCFSScheduler,
+    "rr": RRScheduler,
+    "drr": DRRScheduler,
+    "srf": SRFScheduler,
+    "lottery": LotteryScheduler,
+}
+
+
+def make_scheduler(name, cfg):
+    try:
+        return SCHEDULERS[name](cfg)
+    except KeyError:
+        raise ValueError(f"unknown scheduler {name!r}, expected one of {', '.join(SCHEDULERS)}")
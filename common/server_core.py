@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+# The word server shared by part3 (FCFS) and part4 (RR): one event loop,
+# one I/O path, and a pluggable scheduler (common/scheduler.py) choosing
+# which client is served next. "scheduler" in config.json overrides the
+# part's default.
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from common.eventloop import EventLoop, EVENT_READ, HIGH_WATER, LOW_WATER, make_listener, accept_all, io_stats
+from common.corpus import corpus_from_config
+from common.protocol import AutoCodec
+from common.reloader import Reloader, RELOAD_INTERVAL
+from common.scheduler import make_scheduler, request_size
+from common.ratelimit import limiter_from_config
+from common.metrics import Metrics, DEPTH_BUCKETS, http_response
+from common.ringlog import logger_from_config, DEBUG
+from common import aio_server
+
+IDLE_TIMEOUT = 60.0
+REQUEST_TIMEOUT = 10.0
+OFFLOAD_THREADS = 2
+
+
+def serve(cfg, config_path, default_scheduler="fcfs", default_log_level="warning"):
+    # "log_level" info traces accepts / closes, debug every request (see common/ringlog.py)
+    # words file and config are watched, a change swaps in a new corpus (0 disables)
+    reloader = Reloader(config_path, cfg, corpus_from_config(cfg),
+                        float(cfg.get("reload_interval", RELOAD_INTERVAL)))
+    workers = int(cfg.get("workers", 1))
+    if workers > 1:
+        prefork(cfg, reloader, workers, default_scheduler, default_log_level)
+    else:
+        run_worker(cfg, reloader, default_scheduler, default_log_level)
+
+
+def prefork(cfg, reloader, workers, default_scheduler, default_log_level):
+    # N forked workers, each with its own listening socket on the same port
+    # (SO_REUSEPORT, the kernel spreads new connections over them) and its
+    # own event loop and scheduler. The corpus was loaded above, before the
+    # fork: mmap / ids corpora map the same page cache pages in every worker,
+    # a blob corpus is shared copy-on-write. gc.freeze() keeps the collector
+    # from writing to those objects, which would copy their pages.
+    # Only the parent watches for reloads. It builds the new corpus once and
+    # forks a new set of workers sharing it; the old ones get SIGHUP, stop
+    # listening and exit once their last client is gone.
+    # The parent logs reloads and worker exits itself, flushed from its own
+    # loop: a writer thread could be holding stdout when it forks.
+    logger = logger_from_config(cfg, default_log_level, start=False)
+    reloader.logger = logger
+    pids = []
+
+    def spawn():
+        logger.flush()
+        gc.freeze()
+        started = []
+        for worker in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                status = 0
+                reloader.interval = 0
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                try:
+                    run_worker(cfg, reloader, default_scheduler, default_log_level, worker)
+                except SystemExit:
+                    # SIGTERM, run_worker already cleaned up
+                    pass
+                except BaseException:
+                    traceback.print_exc()
+                    status = 1
+                finally:
+                    sys.stdout.flush()
+                    os._exit(status)
+            started.append(pid)
+        pids.extend(started)
+        return started
+
+    spawn()
+    logger.info("workers", workers, f"{cfg['server_ip']}:{cfg['server_port']}", pids)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+
+    def reaped(pid, status):
+        pids.remove(pid)
+        if status and not stopping:
+            logger.warning("worker_exited", pid, status)
+
+    while pids:
+        logger.flush()
+        try:
+            if not reloader.interval or stopping:
+                reaped(*os.wait())
+                continue
+            time.sleep(min(reloader.interval, 0.5))
+            if reloader.poll():
+                old = list(pids)
+                started = spawn()
+                logger.info("generation", reloader.generation, started, "draining", old)
+                for pid in old:
+                    try:
+                        os.kill(pid, signal.SIGHUP)
+                    except ProcessLookupError:
+                        pass
+            while pids:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if not pid:
+                    break
+                reaped(pid, status)
+        except KeyboardInterrupt:
+            # the terminal sent SIGINT to the workers too
+            continue
+        except ChildProcessError:
+            break
+    logger.close()
+
+
+def run_worker(cfg, reloader, default_scheduler, default_log_level, worker=None):
+    # worker is the prefork index, None for a single process server
+    server_ip = cfg["server_ip"]
+    server_port = int(cfg["server_port"])
+    backlog = int(cfg.get("backlog", 128))
+
+    # bytes of queued output above which a client is paused / below which it resumes
+    high_water = int(cfg.get("out_high_water", HIGH_WATER))
+    low_water = int(cfg.get("out_low_water", LOW_WATER))
+
+    # close clients silent for idle_timeout seconds, and clients that take
+    # longer than request_timeout to finish a request they started
+    # (slowloris); 0 disables either
+    idle_timeout = float(cfg.get("idle_timeout", IDLE_TIMEOUT))
+    request_timeout = float(cfg.get("request_timeout", REQUEST_TIMEOUT))
+
+    logger = logger_from_config(cfg, default_log_level)
+    reloader.logger = logger
+
+    # "select" (default) runs the event loop below, "asyncio" the Protocol
+    # server, which answers every client as its requests arrive (FCFS)
+    if cfg.get("server_mode", "select") == "asyncio":
+        try:
+            aio_server.serve(server_ip, server_port, reloader, backlog, high_water, low_water,
+                             reuse_port=worker is not None, idle_timeout=idle_timeout,
+                             request_timeout=request_timeout)
+        finally:
+            logger.close()
+        return
+
+    name = cfg.get("scheduler", default_scheduler)
+    sched = make_scheduler(name, cfg)
+    # answer all requests of one turn with a single sendmsg instead of one per response
+    coalesce = cfg.get("coalesce_sends", True)
+    # optional token buckets, a client over its rate waits in `parked`
+    limiter = limiter_from_config(cfg)
+
+    srv = make_listener(server_ip, server_port, backlog, reuse_port=worker is not None)
+    loop = EventLoop()
+
+    logger.info("listening", name, f"{server_ip}:{server_port}", f"worker={worker}")
+    tag = "[srv]" if worker is None else f"[srv {worker}]"
+
+    clients = {}  # fd -> Connection
+
+    # metrics are always kept; "stats_port" serves them to Prometheus / curl,
+    # "metrics_file" gets them as JSON at exit
+    metrics = Metrics()
+    bytes_in = metrics.counter("bytes_in_total", "Request bytes received")
+    bytes_out = metrics.counter("bytes_out_total", "Response bytes written to clients")
+    accepted = metrics.counter("connections_total", "Connections accepted")
+    metrics.counter("requests_total", "Requests answered", lambda: io_stats.requests)
+    metrics.counter("recv_calls_total", "recv() calls", lambda: io_stats.recv_calls)
+    metrics.counter("send_calls_total", "sendmsg() calls", lambda: io_stats.send_calls)
+    metrics.gauge("connections_active", "Open client connections", lambda: len(clients))
+    metrics.gauge("clients_ready", "Clients waiting in the scheduler", lambda: len(sched))
+    service_time = metrics.histogram("service_seconds", "Time to build one response")
+    queue_delay = metrics.histogram("queue_delay_seconds", "Time from a request's arrival until it is served")
+    queue_depth = metrics.histogram("queue_depth", "Pending requests of a client after a read", DEPTH_BUCKETS)
+    stats_port = int(cfg.get("stats_port", 0))
+    metrics_file = cfg.get("metrics_file")
+    if worker is not None:
+        # one stats port and one metrics file per worker
+        if stats_port:
+            stats_port += worker
+        if metrics_file:
+            root, ext = os.path.splitext(metrics_file)
+            metrics_file = f"{root}.{worker}{ext}"
+    timeouts = metrics.counter("timeouts_total", "Connections closed by the idle or request timeout")
+
+    queued = set()  # connections currently in the scheduler
+    parked = set()  # connections waiting for their rate limit to refill
+
+    # requests for at least offload_threshold words are answered in a thread
+    # pool, so one large-k client does not hold up everyone else's turn; 0
+    # keeps everything inline. A connection has at most one request in the
+    # pool (`busy`), which keeps its responses in order. Finished responses
+    # come back through `completed`, a byte on the wakeup socket tells the loop.
+    offload_threshold = int(cfg.get("offload_threshold", 0))
+    busy = set()
+    completed = deque()
+    if offload_threshold:
+        pool = ThreadPoolExecutor(int(cfg.get("offload_threads", OFFLOAD_THREADS)))
+        wake_r, wake_w = socket.socketpair()
+        wake_r.setblocking(False)
+        wake_w.setblocking(False)
+    offloaded = metrics.counter("offloaded_total", "Requests answered in the thread pool")
+
+    # "corpus_mode": "sendfile" sends plain text and binary ranges with
+    # os.sendfile straight from words.txt
+    sendfile = cfg.get("corpus_mode") == "sendfile"
+    if sendfile and not reloader.corpus.sendfile:
+        logger.warning("sendfile_unclean", cfg.get("filename", "words.txt"))
+
+    def make_ready(conn):
+        if conn.pending and not conn.paused and not conn.closed and not conn.closing \
+                and conn not in queued and conn not in parked and conn not in busy:
+            if limiter is not None:
+                wait = limiter.wait(conn)
+                if wait:
+                    parked.add(conn)
+                    loop.call_later(wait, unpark, conn)
+                    return
+            queued.add(conn)
+            sched.enqueue(conn)
+
+    def unpark(conn):
+        parked.discard(conn)
+        make_ready(conn)
+
+    def check_timeouts(conn):
+        # one timer per connection; activity only moves timestamps, the
+        # timer re-arms itself for whichever deadline is now nearest
+        conn.timer = None
+        now = time.monotonic()
+        wait = float("inf")
+        if idle_timeout:
+            if conn.pending or conn.out or conn in queued or conn in parked or conn in busy:
+                # the server still owes this client work (rate limited,
+                # scheduled, offloaded or unsent), that is not idleness
+                conn.last_active = now
+            left = conn.last_active + idle_timeout - now
+            if left <= 0:
+                logger.info("idle_timeout", conn.addr)
+                timeouts.value += 1
+                conn.close()
+                return
+            wait = left
+        # a paused connection is not read, its request deadline is stopped
+        if request_timeout and conn.partial_since and not conn.paused:
+            left = conn.partial_since + request_timeout - now
+            if left <= 0:
+                logger.warning("request_timeout", conn.addr)
+                timeouts.value += 1
+                conn.close()
+                return
+            wait = min(wait, left)
+        if wait != float("inf"):
+            conn.timer = loop.call_later(wait, check_timeouts, conn)
+
+    def on_drain(conn):
+        # reading resumes: a request cut off while the server was not
+        # reading gets its full request_timeout from now on
+        if conn.partial_since:
+            conn.partial_since = time.monotonic()
+            if request_timeout:
+                if conn.timer is not None:
+                    loop.cancel(conn.timer)
+                conn.timer = loop.call_later(request_timeout, check_timeouts, conn)
+        make_ready(conn)
+
+    def forget(conn):
+        clients.pop(conn.fd, None)
+        queued.discard(conn)
+        parked.discard(conn)
+        busy.discard(conn)
+        sched.on_close(conn)
+        if limiter is not None:
+            limiter.forget(conn)
+
+    def on_accept(mask):
+        for conn in accept_all(loop, srv, on_accept, logger):
+            accepted.value += 1
+            conn.codec = AutoCodec(sendfile)
+            conn.sendfile = sendfile
+            conn.corpus = reloader.corpus
+            clients[conn.fd] = conn
+            conn.attach(loop, on_readable, on_close=forget, on_drain=on_drain,
+                        high_water=high_water, low_water=low_water)
+            sched.on_connect(conn)
+            if limiter is not None:
+                limiter.connect(conn)
+            logger.info("accepted", conn.addr)
+            if idle_timeout:
+                conn.timer = loop.call_later(idle_timeout, check_timeouts, conn)
+
+    def on_readable(conn):
+        try:
+            n = conn.recv_into(conn.codec.rbuf)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            logger.warning("recv_error", conn.addr)
+            conn.close()
+            return
+        if not n:
+            # client closed connection
+            logger.info("client_closed", conn.addr)
+            conn.close()
+            return
+        bytes_in.value += n
+        # frame complete requests (text lines or binary frames), enqueue
+        reqs = conn.codec.parse()
+        if conn.codec.partial():
+            if not conn.partial_since:
+                conn.partial_since = conn.last_active
+                if request_timeout:
+                    # the request deadline is nearer than any idle deadline
+                    if conn.timer is not None:
+                        loop.cancel(conn.timer)
+                    conn.timer = loop.call_later(request_timeout, check_timeouts, conn)
+        else:
+            conn.partial_since = 0
+        if reqs:
+            now = time.perf_counter()
+            for req in reqs:
+                conn.pending.append(req)
+                conn.arrived.append(now)
+            if logger.enabled(DEBUG):
+                for req in reqs:
+                    logger.debug("enqueued", conn.addr, req)
+            queue_depth.observe(len(conn.pending))
+        make_ready(conn)
+
+    def turn(conn):
+        # serve conn within the scheduler's budget
+        max_requests, max_bytes = sched.budget(conn)
+        if limiter is not None:
+            max_requests = min(max_requests, limiter.allowed(conn))
+        pending = conn.pending
+        arrived = conn.arrived
+        batch = []
+        batch_bytes = 0
+        served = 0
+        sent = 0
+        eof = False
+        start = time.perf_counter()
+        while pending and served < max_requests and sent < max_bytes and not conn.paused:
+            if offload_threshold and request_size(pending[0]) >= offload_threshold:
+                # responses already built go first, the rest of the queue
+                # waits for this one
+                if batch:
+                    conn.write(batch)
+                    batch = []
+                queue_delay.observe(start - arrived.popleft())
+                busy.add(conn)
+                pool.submit(build, conn, pending.popleft())
+                break
+            queue_delay.observe(start - arrived.popleft())
+            try:
+                response, eof = conn.codec.respond(pending.popleft(), conn.corpus)
+                io_stats.requests += 1
+            except Exception:
+                traceback.print_exc()
+                response, eof = conn.codec.error()
+            # one clock read per response, its end is the next one's start
+            end = time.perf_counter()
+            service_time.observe(end - start)
+            start = end
+            served += 1
+            size = sum(len(b) for b in response)
+            sent += size
+            if coalesce:
+                batch.extend(response)
+                batch_bytes += size
+                # a batch this big would pause the client anyway, send it now
+                if batch_bytes > high_water:
+                    conn.write(batch)
+                    batch = []
+                    batch_bytes = 0
+            else:
+                conn.write(response)
+            if eof or conn.closed:
+                break
+        if batch:
+            conn.write(batch)
+        finish(conn, served, sent, eof)
+
+    def finish(conn, served, sent, eof):
+        if conn.closed:
+            logger.warning("send_error", conn.addr)
+        elif eof:
+            # If response contained EOF, close client so client sees EOF and exits
+            logger.info("eof_close", conn.addr)
+            conn.pending.clear()
+            conn.arrived.clear()
+            conn.close_when_flushed()
+        bytes_out.value += sent
+        sched.charge(conn, sent, not conn.pending)
+        if limiter is not None:
+            limiter.charge(conn, served, sent)
+        make_ready(conn)
+
+    def build(conn, req):
+        # runs in a pool thread; nothing else touches conn.codec until the
+        # response is back on the loop
+        start = time.perf_counter()
+        try:
+            response, eof = conn.codec.respond(req, conn.corpus)
+        except Exception:
+            traceback.print_exc()
+            response, eof = conn.codec.error()
+        completed.append((conn, response, eof, time.perf_counter() - start))
+        try:
+            wake_w.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            # the loop has wakeups pending already
+            pass
+
+    def on_wakeup(mask):
+        try:
+            while wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while completed:
+            conn, response, eof, elapsed = completed.popleft()
+            busy.discard(conn)
+            if conn.closed:
+                continue
+            io_stats.requests += 1
+            offloaded.value += 1
+            service_time.observe(elapsed)
+            conn.write(response)
+            finish(conn, 1, sum(len(b) for b in response), eof)
+
+    def schedule():
+        # one round: as many turns as clients were ready when it started
+        for _ in range(len(sched)):
+            conn = sched.dequeue()
+            queued.discard(conn)
+            if conn.closed or conn.paused or not conn.pending:
+                continue
+            turn(conn)
+
+    def on_stats_accept(mask):
+        for conn in accept_all(loop, stats_srv, on_stats_accept, logger):
+            conn.attach(loop, on_stats_request)
+            if idle_timeout:
+                conn.timer = loop.call_later(idle_timeout, check_timeouts, conn)
+
+    def on_stats_request(conn):
+        # answer whatever arrives first, any path gets the metrics
+        try:
+            data = conn.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            conn.close()
+            return
+        conn.write(http_response(metrics.render()))
+        conn.close_when_flushed()
+
+    loop.register(srv, EVENT_READ, on_accept)
+    if offload_threshold:
+        loop.register(wake_r, EVENT_READ, on_wakeup)
+    if stats_port:
+        # reuse_port: a replacement worker binds it while the old one drains
+        stats_srv = make_listener(server_ip, stats_port, backlog, reuse_port=worker is not None)
+        loop.register(stats_srv, EVENT_READ, on_stats_accept)
+        logger.info("metrics", f"http://{server_ip}:{stats_port}/metrics")
+    # runners stop the server with SIGTERM, still print the counters
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # a prefork worker replaced after a reload gets SIGHUP: it stops
+    # accepting and exits once its last client has gone
+    draining = []
+    if worker is not None:
+        signal.signal(signal.SIGHUP, lambda signum, frame: draining.append(signum))
+    try:
+        # a pending request must not wait for the next readiness event
+        while True:
+            loop.run_once(0 if len(sched) else 0.5)
+            schedule()
+            reloader.poll()
+            if draining:
+                if srv.fileno() >= 0:
+                    logger.info("draining", len(clients))
+                    loop.unregister(srv)
+                    srv.close()
+                    if stats_port:
+                        loop.unregister(stats_srv)
+                        stats_srv.close()
+                if not clients:
+                    break
+    except KeyboardInterrupt:
+        logger.info("interrupted")
+    except Exception:
+        print(f"{tag} unexpected error")
+        traceback.print_exc()
+    finally:
+        for conn in list(clients.values()):
+            conn.close()
+        loop.close()
+        srv.close()
+        if offload_threshold:
+            pool.shutdown(wait=False, cancel_futures=True)
+            wake_r.close()
+            wake_w.close()
+        if stats_port:
+            stats_srv.close()
+        if metrics_file:
+            metrics.dump(metrics_file)
+        # flush the event log before the summary below
+        logger.info("terminated")
+        logger.close()
+        print(f"{tag} {io_stats}")
+        if reloader.corpus.cache is not None:
+            print(f"{tag} {reloader.corpus.cache}")
+        if limiter is not None:
+            print(f"{tag} {limiter}")
+        sys.stdout.flush()
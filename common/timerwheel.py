@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Hashed timer wheel: `size` slots of `tick` seconds each, a timer goes into
+# the slot its deadline falls in and carries the number of full turns of the
+# wheel still to wait. Scheduling and cancelling are O(1) set operations;
+# advancing costs one slot per elapsed tick plus the timers found in it,
+# however many timers are pending. Deadlines are rounded up to the next tick.
+import math
+import time
+
+TICK = 0.01
+WHEEL_SIZE = 1024
+
+
+class Timer:
+    __slots__ = ("callback", "args", "rounds", "slot")
+
+    def __init__(self, callback, args, rounds, slot):
+        self.callback = callback
+        self.args = args
+        self.rounds = rounds
+        self.slot = slot
+
+
+class TimerWheel:
+    def __init__(self, tick=TICK, size=WHEEL_SIZE):
+        self.tick = tick
+        self.size = size
+        self.slots = [set() for _ in range(size)]
+        self.pos = 0  # slot of the last tick processed
+        self.last = time.monotonic()  # when that tick ended
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def schedule(self, delay, callback, *args):
+        # -> Timer, fires callback(*args) no earlier than delay seconds from now
+        ticks = max(1, math.ceil((time.monotonic() - self.last + delay) / self.tick))
+        slot = (self.pos + ticks) % self.size
+        timer = Timer(callback, args, (ticks - 1) // self.size, slot)
+        self.slots[slot].add(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer.slot is not None:
+            self.slots[timer.slot].discard(timer)
+            timer.slot = None
+            self.count -= 1
+
+    def timeout(self, limit=None):
+        # how long the event loop may block: until the end of the first tick
+        # that has a timer due in this turn of the wheel. Only the slots
+        # within limit are looked at, empty ones cost one test each.
+        if not self.count:
+            return limit
+        slots, size, pos = self.slots, self.size, self.pos
+        horizon = size if limit is None else min(size, math.ceil(limit / self.tick) + 1)
+        ticks = horizon
+        for d in range(1, horizon + 1):
+            slot = slots[(pos + d) % size]
+            if slot and not all(timer.rounds for timer in slot):
+                ticks = d
+                break
+        wait = max(0.0, self.last + ticks * self.tick - time.monotonic())
+        return wait if limit is None else min(limit, wait)
+
+    def advance(self, now=None):
+        # fire everything due by now
+        now = time.monotonic() if now is None else now
+        ticks = int((now - self.last) / self.tick)
+        if ticks <= 0:
+            return
+        if not self.count:
+            self.last += ticks * self.tick
+            self.pos = (self.pos + ticks) % self.size
+            return
+        slots = self.slots
+        for _ in range(ticks):
+            # one tick at a time, so callbacks that schedule see a consistent wheel
+            self.last += self.tick
+            self.pos = (self.pos + 1) % self.size
+            slot = slots[self.pos]
+            if not slot:
+                continue
+            due = []
+            for timer in slot:
+                if timer.rounds:
+                    timer.rounds -= 1
+                else:
+                    due.append(timer)
+            for timer in due:
+                slot.discard(timer)
+                timer.slot = None
+                self.count -= 1
+            for timer in due:
+                timer.callback(*timer.args)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# Sliding request window for the pipelining clients (--window). Instead of
+# sending c requests and waiting for all c responses, the client keeps up to
+# `size` requests outstanding and sends a new one as each response arrives,
+# so there is no idle round trip between batches.
+#
+# The window is resized once per round, AIMD style. A round ends after one
+# window's worth of responses, but never before one smoothed RTT of wall
+# time: responses read from one buffered recv arrive together, and a round
+# made only of those would measure an absurd rate. The window doubles until
+# the first decrease (slow start), then grows by one request per round.
+# One more request changes the rate by less than the noise between rounds,
+# so growth is judged in steps: whenever the window has grown by 1/beta
+# since the last checkpoint, the smoothed response rate is compared with
+# the one at the checkpoint. If it did not improve and the round's mean RTT
+# is more than `slack` above the lowest recent RTT, the extra requests are
+# only queueing (the link or the server is saturated) and the window is
+# multiplied by `beta`. The lowest RTT is taken over the last
+# MIN_RTT_ROUNDS rounds, so one lucky early sample cannot make every later
+# round look queued.
+import time
+from collections import deque
+
+from common.protocol import F_EOF
+
+MAX_WINDOW = 256
+SLACK = 0.5
+BETA = 0.75
+# a rate within this much of the checkpoint's does not count as an improvement
+GAIN = 0.05
+# EWMA weights of a new RTT sample and of a new round's rate
+RTT_ALPHA = 0.125
+RATE_ALPHA = 0.25
+MIN_RTT_ROUNDS = 32
+
+
+class AIMDWindow:
+    def __init__(self, initial=1, max_size=MAX_WINDOW, slack=SLACK, beta=BETA):
+        self.cwnd = float(max(1, min(initial, max_size)))
+        self.max_size = max_size
+        self.slack = slack
+        self.beta = beta
+        self.slow_start = True
+        self.srtt = None
+        self.rate = None  # smoothed responses/s
+        self.mark = None  # (window, smoothed rate) at the last checkpoint
+        self.min_rtts = deque(maxlen=MIN_RTT_ROUNDS)  # lowest RTT of each recent round
+        self.min_rtt = None
+        self.peak = self.size()
+        self.decreases = 0
+        self.round_start = time.perf_counter()
+        self.round_count = 0
+        self.round_rtt = 0.0
+        self.round_min = float("inf")
+
+    def size(self):
+        return int(self.cwnd)
+
+    def on_response(self, rtt, now):
+        self.srtt = rtt if self.srtt is None else self.srtt + RTT_ALPHA * (rtt - self.srtt)
+        self.round_count += 1
+        self.round_rtt += rtt
+        self.round_min = min(self.round_min, rtt)
+        elapsed = now - self.round_start
+        if self.round_count < self.size() or elapsed < self.srtt:
+            return
+        self.min_rtts.append(self.round_min)
+        self.min_rtt = min(self.min_rtts)
+        rate = self.round_count / elapsed
+        # in slow start every round doubles the window, an average would lag behind
+        if self.rate is None or self.slow_start:
+            self.rate = rate
+        else:
+            self.rate += RATE_ALPHA * (rate - self.rate)
+        queueing = self.round_rtt / self.round_count > self.min_rtt * (1 + self.slack)
+        if self.mark is None:
+            self.mark = (self.size(), self.rate)
+        elif self.size() >= self.mark[0] / self.beta:
+            if queueing and self.rate <= self.mark[1] * (1 + GAIN):
+                self.cwnd = max(1.0, self.cwnd * self.beta)
+                self.slow_start = False
+                self.decreases += 1
+                self.mark = None
+            else:
+                self.mark = (self.size(), self.rate)
+        if self.mark is not None:
+            if self.slow_start:
+                self.cwnd = min(self.max_size, self.cwnd * 2)
+            else:
+                self.cwnd = min(self.max_size, self.cwnd + 1)
+        self.peak = max(self.peak, self.size())
+        self.round_start = now
+        self.round_count = 0
+        self.round_rtt = 0.0
+        self.round_min = float("inf")
+
+    def __str__(self):
+        min_rtt = (self.min_rtt or 0.0) * 1000
+        return f"window={self.size()} peak={self.peak} decreases={self.decreases} min_rtt_ms={min_rtt:.3f}"
+
+
+def windowed_text(sock, p, k, window, inflater=None):
+    # text "p,k" requests from p on -> every response byte up to the EOF line
+    data = bytearray()
+    sent = deque()  # send time of every outstanding request, oldest first
+    while True:
+        n = window.size() - len(sent)
+        if n > 0:
+            sent.extend([time.perf_counter()] * n)
+            sock.sendall(b"".join(b"%d,%d\n" % (p + i * k, k) for i in range(n)))
+            p += n * k
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        if inflater:
+            chunk = inflater.decompress(chunk)
+        seen = len(data)
+        data += chunk
+        now = time.perf_counter()
+        for _ in range(chunk.count(b"\n")):
+            if sent:
+                window.on_response(now - sent.popleft(), now)
+        # only the new bytes can hold the EOF (plus the 2 before, in case it was split)
+        if data.find(b"EOF", max(0, seen - 2)) >= 0:
+            break
+    return data
+
+
+def windowed_binary(client, p, k, window):
+    # binary RANGE requests from p on -> payloads up to the F_EOF one
+    payloads = []
+    sent = deque()
+    while True:
+        n = window.size() - len(sent)
+        # refill once per recv as in text mode, not once per response
+        if n > 0 and not client.buffered():
+            sent.extend([time.perf_counter()] * n)
+            client.send_ranges((p + i * k, k) for i in range(n))
+            p += n * k
+        flags, payload = client.read_response()
+        now = time.perf_counter()
+        window.on_response(now - sent.popleft(), now)
+        payloads.append(payload)
+        if flags & F_EOF:
+            return payloads
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import os
+import sys
 import socket
 import json
 import time
@@ -6,12 +8,19 @@ import argparse
 from collections import Counter
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.protocol import BinaryClient, F_EOF, COUNT_ALL, count_payloads, request_counts, start_zlib
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Word Counting Client")
     parser.add_argument("--config", type=str, default="config.json", help="Path to config file")
     parser.add_argument("--k", type=str, help="Override k parameter")
     parser.add_argument("--p", type=str, help="Override p parameter")
     parser.add_argument("--quiet", action="store_true", help="Toggle verbose output off")
+    parser.add_argument("--binary", action="store_true", help="Use the length-prefixed binary protocol")
+    parser.add_argument("--ids", action="store_true", help="With --binary, receive dictionary-encoded word ids")
+    parser.add_argument("--count", action="store_true", help="Ask the server for the word counts from p on (COUNT request)")
+    parser.add_argument("--zlib", action="store_true", help="Negotiate zlib compressed responses")
     return parser.parse_args()
 
 def load_config(filename="config.json"):
@@ -44,33 +53,50 @@ def main():
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.connect((server_ip, server_port))
 
-    all_data = ""
-    while True:
-        msg = f"{p},{k}\n"
-        sock.sendall(msg.encode())
-
-        try:
-            data = sock.recv(1024)
-        except socket.error:
-            break
-
-        if not data:
-            break
-
-        chunk = data.decode()
-        all_data += chunk
-
-        if "EOF" in chunk:
-            break
-
-        p += k
+    if args.count:
+        analyse_result = request_counts(sock, p, COUNT_ALL, args.binary, args.ids, args.zlib)
+    elif args.binary:
+        client = BinaryClient(sock, ids=args.ids, compress=args.zlib)
+        payloads = []
+        while True:
+            client.send_ranges([(p, k)])
+            flags, payload = client.read_response()
+            payloads.append(payload)
+            if flags & F_EOF:
+                break
+            p += k
+    else:
+        inflater = start_zlib(sock) if args.zlib else None
+        all_data = bytearray()
+        while True:
+            msg = f"{p},{k}\n"
+            sock.sendall(msg.encode())
+
+            try:
+                data = sock.recv(1024)
+            except socket.error:
+                break
+
+            if not data:
+                break
+
+            if inflater:
+                data = inflater.decompress(data)
+            seen = len(all_data)
+            all_data += data
+
+            if all_data.find(b"EOF", max(0, seen - 2)) >= 0:
+                break
+
+            p += k
 
     elapsed_ms = (time.perf_counter() - start) * 1000
     print(f"ELAPSED_MS:{elapsed_ms:.3f}")
     
     sock.close()
 
-    analyse_result = analyse(all_data)
+    if not args.count:
+        analyse_result = count_payloads(payloads, client.vocab) if args.binary else analyse(all_data.decode())
 
     if not cfg.get("quiet", False):
         for word, count in analyse_result.items():
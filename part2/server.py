@@ -1,50 +1,21 @@
 #!/usr/bin/env python3
+import os
+import sys
 import socket
 import json
 import select
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.corpus import corpus_from_config
+from common.protocol import AutoCodec
+
 def load_config(filename="config.json"):
     with open(filename, "r") as f:
         return json.load(f)
 
-def load_words(filename="words.txt"):
-    words = []
-    with open(filename, "r") as f:
-        for line in f:
-            for w in line.strip().split(","):
-                w = w.strip()
-                if w:
-                    words.append(w)
-    words.append("EOF")
-    return words
-
-def process_request(data, word_list):
-    if not data:
-        return "EOF\n"
-
-    if data.endswith("\n"):
-        data = data[:-1]
-
-    try:
-        p_str, k_str = data.split(",")
-        p, k = int(p_str), int(k_str)
-    except Exception:
-        return "EOF\n"
-
-    n = len(word_list)
-    response_words = []
-    pos = p
-    for pos in range(p, min(p + k, n)):
-        response_words.append(word_list[pos])
-
-    if pos < p + k - 1:  # not enough words
-        response_words.append("EOF")
-
-    return ",".join(response_words) + "\n"
-
 def main():
     cfg = load_config()
-    word_list = load_words(cfg.get("filename", "words.txt"))
+    corpus = corpus_from_config(cfg)
 
     server_ip = cfg["server_ip"]
     server_port = int(cfg["server_port"])
@@ -56,6 +27,7 @@ def main():
     server_sock.setblocking(False)
 
     sockets = [server_sock] 
+    codecs = {}  # text or binary, negotiated on the first bytes of each client
 
     print(f"Concurrent server listening on {server_ip}:{server_port}")
 
@@ -66,17 +38,21 @@ def main():
                 conn, addr = server_sock.accept()
                 conn.setblocking(False)
                 sockets.append(conn)
+                codecs[conn] = AutoCodec()
             else:
                 try:
-                    data = sock.recv(1024).decode()
-                    if data:
-                        response = process_request(data, word_list)
-                        sock.sendall(response.encode())
+                    codec = codecs[sock]
+                    if codec.rbuf.recv_into(sock, 1024):
+                        for req in codec.parse():
+                            response, _ = codec.respond(req, corpus)
+                            sock.sendall(b"".join(response))
                     else:
                         sockets.remove(sock)
+                        codecs.pop(sock, None)
                         sock.close()
                 except Exception:
                     sockets.remove(sock)
+                    codecs.pop(sock, None)
                     sock.close()
 
 if __name__ == "__main__":
@@ -1,4 +1,6 @@
 #!/usr/bin/env python3
+import os
+import sys
 import csv
 import socket
 import json
@@ -7,6 +9,10 @@ import argparse
 from collections import Counter
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.protocol import BinaryClient, F_EOF, COUNT_ALL, count_payloads, request_counts, start_zlib
+from common.window import AIMDWindow, MAX_WINDOW, windowed_text, windowed_binary
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Word Counting Client")
     parser.add_argument("--config", type=str, default="config.json", help="Path to config file")
@@ -15,6 +21,12 @@ def parse_args():
     parser.add_argument("--quiet", action="store_true", help="Toggle verbose output off")
     parser.add_argument("--is_greedy", action="store_true", help="Set this client as the greedy client")
     parser.add_argument("--c", type=int, default=1, help="Number of requests to send in a batch for the greedy client")
+    parser.add_argument("--binary", action="store_true", help="Use the length-prefixed binary protocol")
+    parser.add_argument("--ids", action="store_true", help="With --binary, receive dictionary-encoded word ids")
+    parser.add_argument("--count", action="store_true", help="Ask the server for the word counts from p on (COUNT request)")
+    parser.add_argument("--zlib", action="store_true", help="Negotiate zlib compressed responses")
+    parser.add_argument("--window", action="store_true", help="Keep an adaptive (AIMD) window of requests outstanding instead of batches of c")
+    parser.add_argument("--max_window", type=int, default=MAX_WINDOW, help="Largest window for --window")
 
     return parser.parse_args()
 
@@ -53,39 +65,72 @@ def main():
     sock.connect((server_ip, server_port))
 
     requests_to_send = c if is_greedy else 1 # defaulting c to 1, regualr case
-    all_data = ""
-    while True:
-        for _ in range(requests_to_send):
-            msg = f"{p},{k}\n"
-            sock.sendall(msg.encode())
-            p += k
-
-        responses_received = 0
-        while responses_received < requests_to_send:
-            try:
-                data = sock.recv(1024)
-            except socket.error:
-                data = b""
-            if not data:
-                break
-
-            chunk = data.decode()
-            all_data += chunk
-
-            responses_received += chunk.count("\n")  # each resp ends with newline
-
-            if "EOF" in chunk:
-                break
-
-        if "EOF" in all_data:
-            break
+    window = None
+    if args.count:
+        analyse_result = request_counts(sock, p, COUNT_ALL, args.binary, args.ids, args.zlib)
+    elif args.window:
+        # starts from c, then sizes itself to the round trip time
+        window = AIMDWindow(requests_to_send, args.max_window)
+        if args.binary:
+            client = BinaryClient(sock, ids=args.ids, compress=args.zlib)
+            payloads = windowed_binary(client, p, k, window)
+        else:
+            inflater = start_zlib(sock) if args.zlib else None
+            all_data = windowed_text(sock, p, k, window, inflater)
+    elif args.binary:
+        client = BinaryClient(sock, ids=args.ids, compress=args.zlib)
+        payloads = []
+        eof = False
+        while not eof:
+            client.send_ranges((p + i * k, k) for i in range(requests_to_send))
+            p += requests_to_send * k
+            for _ in range(requests_to_send):
+                flags, payload = client.read_response()
+                payloads.append(payload)
+                if flags & F_EOF:
+                    eof = True
+                    break
+    else:
+        inflater = start_zlib(sock) if args.zlib else None
+        all_data = bytearray()
+        eof = False
+        while not eof:
+            for _ in range(requests_to_send):
+                msg = f"{p},{k}\n"
+                sock.sendall(msg.encode())
+                p += k
+
+            responses_received = 0
+            while responses_received < requests_to_send:
+                try:
+                    data = sock.recv(1024)
+                except socket.error:
+                    data = b""
+                if not data:
+                    eof = True
+                    break
+
+                if inflater:
+                    data = inflater.decompress(data)
+                seen = len(all_data)
+                all_data += data
+
+                responses_received += data.count(b"\n")  # each resp ends with newline
+
+                # only the new bytes can hold the EOF (plus the 2 before, in case it was split)
+                if all_data.find(b"EOF", max(0, seen - 2)) >= 0:
+                    eof = True
+                    break
         
     elapsed_ms = (time.perf_counter() - start) * 1000
     print(f"ELAPSED_MS:{elapsed_ms:.3f}")
+    if window is not None:
+        print(f"WINDOW:{window}")
 
     sock.close()
 
-    analyse_result = analyse(all_data)
+    if not args.count:
+        analyse_result = count_payloads(payloads, client.vocab) if args.binary else analyse(all_data.decode())
 
     if not cfg.get("quiet", False):
         for word, count in analyse_result.items():
@@ -17,12 +17,14 @@ import matplotlib.pyplot as plt
 OUTPUT_PLOT = "p3_plot.png"
 
 RESULTS_CSV = Path("results.csv")
+RATELIMIT_CSV = Path("results_ratelimit.csv")
 SERVER_CMD = "python3 server.py --config config.json"
 CLIENT_CMD = "python3 client.py --config config.json --quiet"
 
 
 class Runner:
     def __init__(self, config_file='config.json'):
+        self.config_file = config_file
         with open(config_file, 'r') as f:
             self.config = json.load(f)
 
@@ -31,6 +33,12 @@ class Runner:
         self.p = self.config['p'] 
         self.k = self.config['k'] 
 
+    def set_config(self, **values):
+        # server and clients both read config.json, the server on its next start
+        self.config.update(values)
+        with open(self.config_file, 'w') as f:
+            json.dump(self.config, f, indent=2)
+
     def calculate_jfi(self, values):
         if not values:
             return 0.0
@@ -153,9 +161,51 @@ class Runner:
                     csv.writer(f).writerow([client_count, run_id, c, jfi])
                 print(f"[INFO] client_count={client_count} c={c} run={run_id} jfi={jfi:.3f}")
 
+    def run_ratelimit(self, client_count, c_values, limits, runs_per_setting=1):
+        # the c sweep once without and once with the token-bucket limits;
+        # throughput is client runs completed per second, summed over clients
+        with RATELIMIT_CSV.open("w", newline="") as f:
+            csv.writer(f).writerow(["rate_limited", "num_clients", "run", "c_value", "throughput", "jfi"])
+        for limited in (False, True):
+            self.set_config(**(limits if limited else {"rate_limit_rps": 0, "rate_limit_bps": 0}))
+            for c in c_values:
+                for run_id in range(1, runs_per_setting + 1):
+                    run_times = self.run_experiment(client_count, c)
+                    throughput = sum(1000.0 / ms for ms in run_times if ms > 0)
+                    jfi = self.compute_jfi_from_ms(run_times) if run_times else 0.0
+                    with RATELIMIT_CSV.open("a", newline="") as f:
+                        csv.writer(f).writerow([int(limited), client_count, run_id, c, throughput, jfi])
+                    print(f"[INFO] rate_limited={limited} c={c} run={run_id} "
+                          f"throughput={throughput:.3f}/s jfi={jfi:.3f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Part 3 experiments")
+    parser.add_argument("--rate_limit", action="store_true", help="Run the c sweep without and with per-client rate limits")
+    parser.add_argument("--rps", type=float, default=0, help="Requests/s per client when rate limited (0: no limit)")
+    parser.add_argument("--bps", type=float, default=12500, help="Bytes/s per client when rate limited (0: no limit)")
+    parser.add_argument("--by", choices=["connection", "ip"], default="connection", help="Limit each connection or each source IP")
+    return parser.parse_args()
+
 
 def main():
+    args = parse_args()
     runner = Runner()
+    if args.rate_limit:
+        keys = ("rate_limit_rps", "rate_limit_bps", "rate_limit_by")
+        saved = {key: runner.config.get(key) for key in keys}
+        try:
+            runner.run_ratelimit(10, list(range(1, 90 + 1, 10)),
+                                 {"rate_limit_rps": args.rps, "rate_limit_bps": args.bps, "rate_limit_by": args.by})
+        finally:
+            # config.json is tracked, put it back even if the sweep failed or was interrupted
+            for key, value in saved.items():
+                if value is None:
+                    runner.config.pop(key, None)
+                else:
+                    runner.config[key] = value
+            runner.set_config()
+        return
     c_values = list(range(1, 90 + 1, 10))
     runner.run_all(client_count=10, c_values=c_values, runs_per_setting=1)
 
@@ -5,22 +5,32 @@ import time
 import glob
 import re
 import csv
+import argparse
 import subprocess
 from pathlib import Path
 from topo_wordcount import make_net
 
 RESULTS_CSV = Path("results.csv")
+MIXED_CSV = Path("results_mixed.csv")
+CAMPAIGN_CSV = Path("results_campaign.csv")
 SERVER_CMD = "python3 -u server.py --config config.json"
 CLIENT_CMD = "python3 client.py --config config.json"
 
 class Runner:
     def __init__(self, config_file='config.json'):
+        self.config_file = config_file
         with open(config_file, 'r') as f:
             self.config = json.load(f)
         # Not strictly needed unless used
         self.server_ip = self.config.get('server_ip', '127.0.0.1')
         self.port = self.config.get('server_port', 8000)
 
+    def set_config(self, **values):
+        # server and clients both read config.json, the server on its next start
+        self.config.update(values)
+        with open(self.config_file, 'w') as f:
+            json.dump(self.config, f, indent=2)
+
     def compute_jfi_from_ms(self, elapsed_ms_list):
         if not elapsed_ms_list:
             return 0.0
@@ -36,7 +46,8 @@ class Runner:
         s2 = sum(x * x for x in throughputs)
         return (s * s) / (n * s2) if s2 > 0 else 0.0
 
-    def run_experiment(self, n_clients, c):
+    def run_experiment(self, n_clients, c, client_cmds=None):
+        # client_cmds overrides the default one greedy + (n_clients - 1) normal clients
         net = make_net()
         net.start()
 
@@ -55,13 +66,12 @@ class Runner:
                 pass
             return []
 
-        # launch greedy client first
+        if client_cmds is None:
+            # greedy client first, then the others
+            client_cmds = [f"{CLIENT_CMD} --is_greedy --c {c}"] + [CLIENT_CMD] * (n_clients - 1)
         client_procs = []
-        greedy_cmd = f"{CLIENT_CMD} --is_greedy --c {c}"
-        client_procs.append((0, client_host.popen(greedy_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)))
-        # launch other clients
-        for i in range(1, n_clients):
-            client_procs.append((i, client_host.popen(CLIENT_CMD, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)))
+        for i, cmd in enumerate(client_cmds):
+            client_procs.append((i, client_host.popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)))
 
         run_times = []
         for cid, proc in client_procs:
@@ -117,8 +127,69 @@ class Runner:
                     csv.writer(f).writerow([client_count, run_id, c, jfi])
                 print(f"[INFO] client_count={client_count} c={c} run={run_id} jfi={jfi:.3f}")
 
+    def run_mixed(self, k_values, c, schedulers=("rr", "drr"), runs_per_setting=1):
+        # every client is greedy with the same c but asks for its own k, so the
+        # clients differ only in response size; JFI then shows whether the
+        # scheduler shares bandwidth (drr) or request count (rr)
+        client_cmds = [f"{CLIENT_CMD} --is_greedy --c {c} --k {k}" for k in k_values]
+        with MIXED_CSV.open("w", newline="") as f:
+            csv.writer(f).writerow(["scheduler", "k_values", "run", "c_value", "jfi"])
+        for scheduler in schedulers:
+            self.set_config(scheduler=scheduler)
+            for run_id in range(1, runs_per_setting + 1):
+                run_times = self.run_experiment(len(k_values), c, client_cmds)
+                jfi = self.compute_jfi_from_ms(run_times) if run_times else 0.0
+                with MIXED_CSV.open("a", newline="") as f:
+                    csv.writer(f).writerow([scheduler, " ".join(map(str, k_values)), run_id, c, jfi])
+                print(f"[INFO] scheduler={scheduler} k={k_values} c={c} run={run_id} jfi={jfi:.3f}")
+
+    def run_campaign(self, schedulers, c_values, client_counts, runs_per_setting=1):
+        # the usual workload (one greedy client with batch c, the rest normal)
+        # under every scheduler; all of them run on the same server core, so
+        # only the scheduling decision differs between rows
+        with CAMPAIGN_CSV.open("w", newline="") as f:
+            csv.writer(f).writerow(["scheduler", "num_clients", "run", "c_value", "throughput", "jfi"])
+        for scheduler in schedulers:
+            self.set_config(scheduler=scheduler)
+            for n in client_counts:
+                for c in c_values:
+                    for run_id in range(1, runs_per_setting + 1):
+                        run_times = self.run_experiment(n, c)
+                        # client runs completed per second, summed over clients
+                        throughput = sum(1000.0 / ms for ms in run_times if ms > 0)
+                        jfi = self.compute_jfi_from_ms(run_times) if run_times else 0.0
+                        with CAMPAIGN_CSV.open("a", newline="") as f:
+                            csv.writer(f).writerow([scheduler, n, run_id, c, throughput, jfi])
+                        print(f"[INFO] scheduler={scheduler} clients={n} c={c} run={run_id} "
+                              f"throughput={throughput:.2f}/s jfi={jfi:.3f}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Part 4 experiments")
+    parser.add_argument("--mixed", action="store_true", help="Mixed-k workload under rr and drr instead of the c sweep")
+    parser.add_argument("--k_values", type=str, default="5,5,5,50,50,50,500,500,500", help="k of every client in the mixed workload")
+    parser.add_argument("--c", type=int, default=20, help="Batch size of the mixed workload clients")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per scheduler in the mixed workload")
+    parser.add_argument("--campaign", action="store_true", help="Sweep schedulers x c x num_clients")
+    parser.add_argument("--schedulers", type=str, default="fcfs,rr,drr,srf,lottery", help="Schedulers of the campaign")
+    parser.add_argument("--c_values", type=str, default="1,11,31,61,91", help="Greedy batch sizes of the campaign")
+    parser.add_argument("--clients", type=str, default="5,10", help="Client counts of the campaign")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     runner = Runner()
+    if args.mixed or args.campaign:
+        scheduler = runner.config.get("scheduler", "rr")
+        try:
+            if args.mixed:
+                runner.run_mixed([int(k) for k in args.k_values.split(",")], args.c, runs_per_setting=args.runs)
+            else:
+                runner.run_campaign(args.schedulers.split(","), [int(c) for c in args.c_values.split(",")],
+                                    [int(n) for n in args.clients.split(",")], runs_per_setting=args.runs)
+        finally:
+            # config.json is tracked, put it back even if the sweep failed or was interrupted
+            runner.set_config(scheduler=scheduler)
+        return
     c_values = list(range(11, 91, 10)) #run for c values at intervals of 10
     runner.run_all(client_count=10, c_values=c_values, runs_per_setting=1)
 